@@ -0,0 +1,75 @@
+"""
+Measure the throughput of `UnorderedRunner` on memory-bound work with producers floating over all
+cpus and pinned with each `affinity` policy. Each producer scans its own buffer, larger than the
+caches, so the throughput depends on cache reuse and on the memory being on the NUMA node of the cpu.
+
+Usage:
+    python benchmarks/affinity.py --workers 2 4 8 --items 2000 --buffer-mb 64
+"""
+import argparse
+import time
+from easycore.common.config import CfgNode as CN
+from easycore.common.parallel import UnorderedRunner
+from easycore.common.parallel.affinity import numa_nodes
+
+
+class ScanRunner(UnorderedRunner):
+
+    @staticmethod
+    def producer_init(device, cfg):
+        # first touched by the producer, so the pages are on the node of its cpus if it is pinned
+        cfg.buffer = bytearray(b"\x01") * (cfg.buffer_mb << 20)
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        # scan a slice of the buffer, a different one for each data
+        size = len(cfg.buffer) // 4
+        start = (data * 7919 * 4096) % (len(cfg.buffer) - size)
+        return cfg.buffer.count(1, start, start + size)
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.count = 0
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.count += 1
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.count
+
+
+def measure(num_workers, affinity, items, buffer_mb):
+    cfg = CN()
+    cfg.buffer_mb = buffer_mb
+    runner = ScanRunner(num_workers, cfg=cfg, affinity=affinity)
+    runner(range(num_workers * 4))  # warm up
+    start = time.perf_counter()
+    count = runner(range(items))
+    elapsed = time.perf_counter() - start
+    runner.close()
+    assert count == items
+    return items / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--affinities", nargs="+", default=["none", "spread", "compact"])
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--buffer-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    print("NUMA nodes: {}".format(numa_nodes()))
+    print("{:>8s}".format("workers") + "".join("{:>12s}".format(a) for a in args.affinities) + "  (items/s)")
+    for num_workers in args.workers:
+        row = "{:>8d}".format(num_workers)
+        for affinity in args.affinities:
+            affinity = None if affinity == "none" else affinity
+            row += "{:>12.0f}".format(measure(num_workers, affinity, args.items, args.buffer_mb))
+        print(row, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Measure the per-item overhead of `UnorderedRunner.__call__` and `OrderedRunner.__call__`
+with trivial `producer_work` and `consumer_work`, so that the cost of the runner protocol
+dominates.
+
+Usage:
+    python benchmarks/call_overhead.py --items 20000 --workers 2 --backends process thread
+"""
+import argparse
+import time
+from easycore.common.parallel import OrderedRunner, UnorderedRunner
+
+
+class CountMixin:
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.count = 0
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.count += 1
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.count
+
+
+class CountUnorderedRunner(CountMixin, UnorderedRunner):
+    pass
+
+
+class CountOrderedRunner(CountMixin, OrderedRunner):
+    pass
+
+
+def measure(runner_class, backend, workers, items, chunksize, repeat):
+    runner = runner_class(workers, backend=backend, chunksize=chunksize)
+    runner(range(workers * 4))  # warm up
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = runner(range(items))
+        best = min(best, time.perf_counter() - start)
+        assert count == items
+    runner.close()
+    return best / items * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--backends", nargs="+", default=["process", "thread"])
+    parser.add_argument("--chunksizes", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("{:>10s}{:>10s}{:>11s}{:>14s}".format("runner", "backend", "chunksize", "us/item"))
+    for runner_class, name in ((CountUnorderedRunner, "unordered"), (CountOrderedRunner, "ordered")):
+        for backend in args.backends:
+            for chunksize in args.chunksizes:
+                cost = measure(runner_class, backend, args.workers, args.items, chunksize, args.repeat)
+                print("{:>10s}{:>10s}{:>11d}{:>14.2f}".format(name, backend, chunksize, cost), flush=True)
+
+
+if __name__ == "__main__":
+    main()
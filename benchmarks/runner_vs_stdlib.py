@@ -0,0 +1,225 @@
+"""
+Compare `OrderedRunner`/`UnorderedRunner` with `multiprocessing.Pool.imap` and
+`concurrent.futures.ProcessPoolExecutor.map`, sweeping payload size, per-item cost, number of
+workers and ordered/unordered mode. Reports items/s and p50/p99 latency from feeding an item
+to receiving its result.
+
+`ProcessPoolExecutor.map` always returns results in order, so it is only measured in ordered mode.
+
+Usage:
+    python benchmarks/runner_vs_stdlib.py --save benchmarks/baselines/runner_vs_stdlib.json
+    python benchmarks/runner_vs_stdlib.py --compare benchmarks/baselines/runner_vs_stdlib.json
+"""
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from easycore.common.parallel import OrderedRunner, UnorderedRunner
+
+
+def work(data):
+    # busy loop for `work_us` microseconds, then return a payload of the same size
+    index, payload, work_us = data
+    end = time.perf_counter() + work_us * 1e-6
+    while time.perf_counter() < end:
+        pass
+    return index, payload
+
+
+class BenchOrderedRunner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return work(data)
+
+
+class BenchUnorderedRunner(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return work(data)
+
+
+def feed(items, payload_size, work_us, fed):
+    """
+    Yield items lazily, recording when each item is taken by the implementation.
+    """
+    payload = b"x" * payload_size
+    for index in range(items):
+        fed[index] = time.perf_counter()
+        yield index, payload, work_us
+
+
+def run_runner(mode, workers, chunksize):
+    runner_class = BenchOrderedRunner if mode == "ordered" else BenchUnorderedRunner
+    runner = runner_class(workers, chunksize=chunksize)
+    def run(data):
+        return runner.imap(data) if mode == "ordered" else runner.imap_unordered(data)
+    return run, runner.close
+
+
+def run_pool(mode, workers, chunksize):
+    pool = mp.Pool(workers)
+    def run(data):
+        imap = pool.imap if mode == "ordered" else pool.imap_unordered
+        return imap(work, data, chunksize=chunksize)
+    def close():
+        pool.close()
+        pool.join()
+    return run, close
+
+
+def run_executor(mode, workers, chunksize):
+    executor = ProcessPoolExecutor(workers)
+    def run(data):
+        return executor.map(work, data, chunksize=chunksize)
+    return run, executor.shutdown
+
+
+IMPLEMENTATIONS = {
+    "easycore": run_runner,
+    "pool": run_pool,
+    "executor": run_executor,
+}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure(impl, mode, workers, payload_size, work_us, items, chunksize):
+    run, close = IMPLEMENTATIONS[impl](mode, workers, chunksize)
+    try:
+        # warm up, so that starting workers is not measured
+        for _ in run(feed(workers * chunksize * 2, payload_size, work_us, {})):
+            pass
+        fed = {}
+        latencies = []
+        start = time.perf_counter()
+        count = 0
+        for index, payload in run(feed(items, payload_size, work_us, fed)):
+            latencies.append(time.perf_counter() - fed[index])
+            count += 1
+        elapsed = time.perf_counter() - start
+    finally:
+        close()
+    assert count == items
+    return {
+        "impl": impl,
+        "mode": mode,
+        "workers": workers,
+        "payload": payload_size,
+        "work_us": work_us,
+        "items_per_s": items / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+    }
+
+
+def key(result):
+    return (result["impl"], result["mode"], result["workers"], result["payload"], result["work_us"])
+
+
+def machine_config(args):
+    return {
+        "items": args.items,
+        "chunksize": args.chunksize,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": mp.cpu_count(),
+    }
+
+
+# settings which must match the baseline for throughputs to be comparable
+COMPARED_CONFIG = ("items", "chunksize", "cpus")
+
+
+def load_baseline(baseline_path, config):
+    """
+    Returns:
+        dict: baseline results by case.
+
+    Raises:
+        SystemExit: if the baseline was measured with other settings or another number of cpus.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    mismatches = ["{} is {}, baseline {}".format(name, config[name], baseline["config"].get(name))
+                  for name in COMPARED_CONFIG if baseline["config"].get(name) != config[name]]
+    if mismatches:
+        sys.exit("can not compare with {}: {}.".format(baseline_path, ", ".join(mismatches)))
+    return {key(result): result for result in baseline["results"]}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns:
+        list[str]: cases missing from the baseline, and cases whose throughput dropped by more
+            than `tolerance` from the baseline.
+    """
+    regressions = []
+    for result in results:
+        base = baseline.get(key(result))
+        if base is None:
+            regressions.append("{} {} workers={} payload={} work_us={}: missing from the baseline".format(*key(result)))
+            continue
+        ratio = result["items_per_s"] / base["items_per_s"]
+        if ratio < 1.0 - tolerance:
+            regressions.append("{} {} workers={} payload={} work_us={}: {:.0f} items/s, baseline {:.0f} ({:+.0%})".format(
+                *key(result), result["items_per_s"], base["items_per_s"], ratio - 1.0))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--impls", nargs="+", default=list(IMPLEMENTATIONS), choices=list(IMPLEMENTATIONS))
+    parser.add_argument("--modes", nargs="+", default=["ordered", "unordered"], choices=["ordered", "unordered"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--payloads", type=int, nargs="+", default=[64, 65536], help="bytes of each item and result")
+    parser.add_argument("--work-us", type=float, nargs="+", default=[0.0, 200.0], help="cost of each item")
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--chunksize", type=int, default=8)
+    parser.add_argument("--save", help="write results to this json file")
+    parser.add_argument("--compare", help="json file of baseline results, exit with 1 on regressions or cases "
+                        "missing from it")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative drop of items/s")
+    args = parser.parse_args()
+    config = machine_config(args)
+    # checked before measuring, a baseline of other settings can not be compared
+    baseline = load_baseline(args.compare, config) if args.compare is not None else None
+
+    print("{:>10s}{:>11s}{:>9s}{:>10s}{:>9s}{:>12s}{:>10s}{:>10s}".format(
+        "impl", "mode", "workers", "payload", "work_us", "items/s", "p50 ms", "p99 ms"))
+    results = []
+    for mode, workers, payload_size, work_us, impl in itertools.product(
+            args.modes, args.workers, args.payloads, args.work_us, args.impls):
+        if impl == "executor" and mode == "unordered":
+            continue
+        result = measure(impl, mode, workers, payload_size, work_us, args.items, args.chunksize)
+        results.append(result)
+        print("{impl:>10s}{mode:>11s}{workers:>9d}{payload:>10d}{work_us:>9.0f}{items_per_s:>12.0f}"
+              "{p50_ms:>10.2f}{p99_ms:>10.2f}".format(**result), flush=True)
+
+    if args.save is not None:
+        with open(args.save, "w") as f:
+            json.dump({
+                "config": config,
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+
+    if args.compare is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("regression: " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
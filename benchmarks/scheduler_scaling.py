@@ -0,0 +1,68 @@
+"""
+Measure how the throughput of `UnorderedRunner` scales with the number of workers
+for each scheduler.
+
+Usage:
+    python benchmarks/scheduler_scaling.py --workers 1 2 4 8 16 32 64 --items 20000 --work-us 200
+"""
+import argparse
+import time
+from easycore.common.config import CfgNode as CN
+from easycore.common.parallel import UnorderedRunner
+
+
+class BusyRunner(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        # busy loop for `cfg.work_us` microseconds
+        end = time.perf_counter() + cfg.work_us * 1e-6
+        while time.perf_counter() < end:
+            pass
+        return data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.count = 0
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.count += 1
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.count
+
+
+def measure(num_workers, scheduler, items, work_us, chunksize):
+    cfg = CN()
+    cfg.work_us = work_us
+    runner = BusyRunner(num_workers, cfg=cfg, scheduler=scheduler, chunksize=chunksize)
+    runner(range(num_workers * 4))  # warm up
+    start = time.perf_counter()
+    count = runner(range(items))
+    elapsed = time.perf_counter() - start
+    runner.close()
+    assert count == items
+    return items / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--schedulers", nargs="+", default=["shared", "round_robin", "least_loaded"])
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--work-us", type=float, default=200.0)
+    parser.add_argument("--chunksize", type=int, default=1)
+    args = parser.parse_args()
+
+    print("{:>8s}".format("workers") + "".join("{:>16s}".format(s) for s in args.schedulers) + "  (items/s)")
+    for num_workers in args.workers:
+        row = "{:>8d}".format(num_workers)
+        for scheduler in args.schedulers:
+            row += "{:>16.0f}".format(measure(num_workers, scheduler, args.items, args.work_us, args.chunksize))
+        print(row, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Measure the per-item overhead of `UnorderedRunner.__call__` with each serializer, for payloads
+echoed back by `producer_work`: small dicts, large bytes and, if numpy is installed, large arrays.
+"default" lets the queues pickle the chunks. Serializers whose package is missing are skipped.
+Every serializer produces a payload the queues pickle again, so none of them is zero-copy and
+large arrays are cheapest with "default" or `shared_memory=True`.
+
+Usage:
+    python benchmarks/serializers.py --items 5000 --workers 2 --payloads small bytes array
+"""
+import argparse
+import time
+from easycore.common.config import CfgNode as CN
+from easycore.common.parallel import UnorderedRunner
+from easycore.common.parallel.serialization import get_serializer
+
+
+class EchoRunner(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.count = 0
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.count += 1
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.count
+
+
+def make_payload(kind, size_kb):
+    if kind == "small":
+        return {"id": 1, "name": "item", "values": [0.5] * 8}
+    if kind == "bytes":
+        return b"x" * (size_kb << 10)
+    import numpy as np
+    return np.ones((size_kb << 10) // 8)
+
+
+def measure(serializer, payload, workers, items, repeat):
+    runner = EchoRunner(workers, serializer=serializer)
+    data_list = [payload] * items
+    runner(data_list[:workers * 4])  # warm up
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = runner(data_list)
+        best = min(best, time.perf_counter() - start)
+        assert count == items
+    runner.close()
+    return best / items * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--serializers", nargs="+", default=["default", "pickle", "pickle5", "cloudpickle", "msgpack"])
+    parser.add_argument("--payloads", nargs="+", default=["small", "bytes", "array"])
+    parser.add_argument("--size-kb", type=int, default=256, help="size of the bytes and array payloads.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    serializers = []
+    for name in args.serializers:
+        try:
+            if name != "default":
+                get_serializer(name)
+        except ImportError:
+            print("skip {}: not installed".format(name))
+            continue
+        serializers.append(name)
+
+    print("{:>8s}".format("payload") + "".join("{:>14s}".format(name) for name in serializers) + "  (us/item)")
+    for kind in args.payloads:
+        try:
+            payload = make_payload(kind, args.size_kb)
+        except ImportError:
+            print("skip {}: numpy is not installed".format(kind))
+            continue
+        row = "{:>8s}".format(kind)
+        for name in serializers:
+            if name == "msgpack" and kind == "array":
+                # arrays are not supported by msgpack
+                row += "{:>14s}".format("-")
+                continue
+            serializer = None if name == "default" else name
+            row += "{:>14.1f}".format(measure(serializer, payload, args.workers, args.items, args.repeat))
+        print(row, flush=True)
+
+
+if __name__ == "__main__":
+    main()
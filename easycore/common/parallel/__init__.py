@@ -1,3 +1,5 @@
 from .engine import BaseRunner, UnorderedRunner, OrderedRunner
+from .pipeline import Pipeline
+from .distributed import DistributedRunner
 
-__all__ = ["BaseRunner", "UnorderedRunner", "OrderedRunner"]
\ No newline at end of file
+__all__ = ["BaseRunner", "UnorderedRunner", "OrderedRunner", "Pipeline", "DistributedRunner"]
\ No newline at end of file
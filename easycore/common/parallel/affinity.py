@@ -0,0 +1,82 @@
+import glob
+import os
+import re
+
+__all__ = ["available_cpus", "numa_nodes", "worker_cpus"]
+
+# automatic placement policies of `worker_cpus`
+POLICIES = ("spread", "compact")
+
+
+def available_cpus():
+    """
+    Returns:
+        list[int]: cpus this process may run on.
+    """
+    return sorted(os.sched_getaffinity(0))
+
+
+def _parse_cpulist(text):
+    """
+    Parse a cpu list of sysfs such as "0-3,8-11".
+    """
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def numa_nodes():
+    """
+    Returns:
+        list[list[int]]: available cpus of each NUMA node with available cpus, read from sysfs.
+            All available cpus make one node if the topology is unknown.
+    """
+    cpus = set(available_cpus())
+    nodes = []
+    paths = glob.glob("/sys/devices/system/node/node[0-9]*/cpulist")
+    for path in sorted(paths, key=lambda path: int(re.search(r"node(\d+)", path).group(1))):
+        try:
+            with open(path) as f:
+                node = sorted(cpus.intersection(_parse_cpulist(f.read())))
+        except (OSError, ValueError):
+            continue
+        if node:
+            nodes.append(node)
+    if sum(len(node) for node in nodes) != len(cpus):
+        # unknown or inconsistent topology
+        return [sorted(cpus)]
+    return nodes
+
+
+def worker_cpus(affinity, index, nodes = None):
+    """
+    Args:
+        affinity (str or list): "spread" places producers on cpus of the NUMA nodes in turn, so that
+            they share caches and memory bandwidth as little as possible. "compact" fills the cpus
+            of a node before the next one, so that producers exchanging data stay close. A list
+            gives the cpus of producer `index` at `index % len(affinity)`.
+        index (int): index of the producer.
+        nodes (list[list[int]] or None): cpus of each NUMA node, None means `numa_nodes()`.
+
+    Returns:
+        set[int]: cpus producer `index` is pinned to.
+    """
+    if not isinstance(affinity, str):
+        cpus = affinity[index % len(affinity)]
+        return set([cpus] if isinstance(cpus, int) else cpus)
+
+    if nodes is None:
+        nodes = numa_nodes()
+    if affinity == "compact":
+        order = [cpu for node in nodes for cpu in node]
+    else:
+        # first cpu of each node, then the second one of each node, ...
+        order = [node[i] for i in range(max(len(node) for node in nodes)) for node in nodes if i < len(node)]
+    return {order[index % len(order)]}
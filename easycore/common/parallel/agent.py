@@ -0,0 +1,35 @@
+import argparse
+import multiprocessing as mp
+import os
+import sys
+from easycore.common.parallel.distributed import run_agent
+
+__all__ = ["main"]
+
+
+def main(args = None):
+    """
+    Entry point of ``easycore-agent``, start an agent for each device.
+    """
+    parser = argparse.ArgumentParser(prog="easycore-agent", description="Run producers of an easycore DistributedRunner.")
+    parser.add_argument("--address", required=True, help="host:port or path of a Unix socket of the runner.")
+    parser.add_argument("--authkey", default=os.environ.get("EASYCORE_AUTHKEY"),
+                        help="key of the runner, EASYCORE_AUTHKEY by default. Other users see command "
+                             "lines in process listings, prefer the environment variable.")
+    parser.add_argument("--devices", nargs="+", default=["cpu"], help="devices, an agent is started for each.")
+    parser.add_argument("--path", action="append", default=[], help="directory added to sys.path to import the runner class.")
+    parser.add_argument("--retry-timeout", type=float, default=30.0, help="seconds to retry connecting.")
+    args = parser.parse_args(args)
+
+    sys.path[:0] = args.path
+
+    agents = [mp.Process(target=run_agent, args=(args.address, args.authkey, device, args.retry_timeout))
+              for device in args.devices]
+    for agent in agents:
+        agent.start()
+    for agent in agents:
+        agent.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import queue
+import time
+from easycore.common.parallel.metrics import _trace_event, _trace_async_event
+
+
+class _ProducerBatching:
+    """
+    Producer side of dynamic batching: gathering the data of several chunks and calling
+    `work_func` once on a list of them.
+    """
+
+    # seconds a producer gathering a batch waits on the queues before checking whether the runner
+    # can dispatch more chunks.
+    _BATCH_POLL_INTERVAL = 0.001
+
+    def _setup_batching(self, batch_size = None, batch_wait = 0.0, dispatch_blocked = None):
+        """
+        Args:
+            batch_size (int or None): number of data of a batch, None means `work_func` is called
+                on each data.
+            batch_wait (float): seconds to wait for more data to fill a batch.
+            dispatch_blocked (RawValue or None): shared flag set by the runner while it can not
+                dispatch more chunks, so that batches are not held for `batch_wait` waiting for
+                data which do not come.
+        """
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.dispatch_blocked = dispatch_blocked
+
+    def _work_batch(self, shm_writer, data, index):
+        """
+        Gather tasks after `data` until `batch_size` data are got, `batch_wait` seconds passed or
+        the queues are empty while the runner can not dispatch more chunks, call `work_func` on
+        lists of at most `batch_size` data of them, and send the results of each task.
+
+        Returns:
+            bool: whether a stop token was got while gathering.
+        """
+        tasks = [(data, index, time.time())]
+        count = len(data[1])
+        stop = False
+        deadline = time.time() + self.batch_wait
+        while count < self.batch_size:
+            remaining = deadline - time.time()
+            try:
+                data, index = self._get_task(timeout=min(max(0.0, remaining), self._BATCH_POLL_INTERVAL))
+            except queue.Empty:
+                if remaining <= 0 or self.dispatch_blocked is None or self.dispatch_blocked.value:
+                    break
+                continue
+            if isinstance(data, self._StopToken):
+                stop = True
+                break
+            tasks.append((data, index, time.time()))
+            count += len(data[1])
+
+        batch = []
+        for data, index, taken in tasks:
+            self._hold(data[0], index)
+            if self.trace and len(data) > 2:
+                self._events.append(_trace_async_event("input_queue", "b", data[2], self.trace_pid, data[0]))
+                self._events.append(_trace_async_event("input_queue", "e", taken, self.trace_pid, data[0]))
+            batch.extend(data[1])
+
+        start = time.perf_counter()
+        trace_start = time.time()
+        try:
+            results = self._compute_batch(batch)
+        except Exception:
+            # all the tasks of the batch fail
+            elapsed = time.perf_counter() - start
+            for data, index, taken in tasks:
+                self._send_error(data[0], index, len(data[1]), elapsed * len(data[1]) / len(batch))
+            return stop
+        elapsed = time.perf_counter() - start
+        if self.trace:
+            self._events.append(_trace_event("producer_work", trace_start, time.time(), self.index,
+                                             {"chunks": [data[0] for data, index, taken in tasks]}))
+
+        # split results back into the tasks, the time is shared in proportion to their data
+        offset = 0
+        for data, index, taken in tasks:
+            size = len(data[1])
+            queue_wait = taken - data[2] if len(data) > 2 else None
+            try:
+                self._send(shm_writer, data[0], results[offset : offset + size], elapsed * size / len(batch),
+                           index, size, queue_wait)
+            except Exception:
+                self._send_error(data[0], index, size, elapsed * size / len(batch))
+            offset += size
+        return stop
+
+    def _compute_batch(self, batch):
+        """
+        Returns:
+            list: results of `work_func` on lists of at most `batch_size` data of `batch`, read
+                from the cache for cached data.
+        """
+        results = [None] * len(batch)
+        # positions of the data whose results are not cached
+        missing = []
+        for position, data in enumerate(batch):
+            if self.cache is not None:
+                hit, results[position] = self.cache.get(data)
+                if hit:
+                    continue
+            missing.append(position)
+        for offset in range(0, len(missing), self.batch_size):
+            positions = missing[offset : offset + self.batch_size]
+            outputs = self.work_func(self.device, self.cfg, [batch[position] for position in positions])
+            if len(outputs) != len(positions):
+                raise Exception("`producer_work` must return a result for each of the {} data of a batch, got {}.".format(
+                    len(positions), len(outputs)))
+            for i, position in enumerate(positions):
+                results[position] = outputs[i]
+                if self.cache is not None:
+                    self.cache.put(batch[position], outputs[i])
+        return results
+
+
+class _RunnerBatching:
+    """
+    Runner side of dynamic batching, see `max_batch_size` of `BaseRunner`.
+    """
+
+    def _init_batching(self, max_batch_size, max_wait_ms):
+        """
+        Check and set the arguments of dynamic batching, see `BaseRunner`. Must be called after
+        `_combine` is set.
+        """
+        if max_batch_size is not None and not (isinstance(max_batch_size, int) and max_batch_size >= 1):
+            raise Exception("parameter `max_batch_size` must be a positive int or None.")
+        if not (isinstance(max_wait_ms, (int, float)) and max_wait_ms >= 0):
+            raise Exception("parameter `max_wait_ms` must be a non-negative number.")
+        if max_batch_size is not None and self._combine:
+            raise Exception("`max_batch_size` does not support runners with `producer_combine`.")
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
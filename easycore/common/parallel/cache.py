@@ -0,0 +1,215 @@
+import hashlib
+import multiprocessing as mp
+import os
+import pickle
+import tempfile
+
+__all__ = ["ResultCache"]
+
+
+class ResultCache:
+    """
+    On-disk cache of the results of `producer_work`, keyed by a hash of the runner class, its
+    `cfg` (or the keys of it that matter) and the data. Each result is a file under `path`, so the
+    cache is shared by the producers of a runner, by runners in other processes and by later runs.
+
+    Files are written to a temporary file and renamed, so readers never see partial results, and a
+    result removed by another process is a miss. A result which can not be unpickled is a miss too,
+    its file is removed. When the files exceed `max_bytes`, the least recently used ones are
+    removed. Removals in several processes at once may remove a few more results than needed, they
+    never break the cache.
+
+    The size of the results is counted in shared memory by the processes of a bound cache (the
+    producers of a runner), so `max_bytes` bounds them together and the directory is scanned once.
+    Runners in other processes count their own results and only see the others' when they evict,
+    so `max_bytes` is a soft bound across them.
+    """
+
+    # suffix of the files of results
+    _SUFFIX = ".pkl"
+
+    # fraction of `max_bytes` kept after evicting, so that eviction does not run on every put.
+    _EVICT_RATIO = 0.9
+
+    def __init__(self, path:str, max_bytes:int = 1 << 30, cfg_keys = None, version:str = ""):
+        """
+        Args:
+            path (str): directory of the cache, created if it does not exist.
+            max_bytes (int or None): bound of the size of the cached results. None means unbounded.
+            cfg_keys (list[str] or None): keys of `cfg` which change the results of `producer_work`.
+                None means the whole `cfg`, which must be picklable then.
+            version (str): change it to invalidate results computed by a previous version of
+                `producer_work`.
+        """
+        if max_bytes is not None and not (isinstance(max_bytes, int) and max_bytes >= 1):
+            raise Exception("parameter `max_bytes` must be a positive int or None.")
+        self.path = os.path.abspath(os.path.expanduser(path))
+        os.makedirs(self.path, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.cfg_keys = None if cfg_keys is None else list(cfg_keys)
+        self.version = version
+        # hash of the runner class, cfg and version, set by `bind`
+        self.namespace = None
+        # shared bytes of the cached results, -1 until the directory is scanned, set by `bind`
+        self._size = None
+
+    def bind(self, runner_class, cfg, context = None):
+        """
+        Args:
+            runner_class (type): class of the runner.
+            cfg (easycore.common.config.CfgNode): cfg of the runner, before `producer_init`.
+            context (multiprocessing.context.BaseContext or None): context of the processes the
+                bound cache is shared with. None means the default context.
+
+        Returns:
+            ResultCache: a copy of this cache for the results of `runner_class` with `cfg`.
+        """
+        if self.cfg_keys is None:
+            relevant = cfg
+        else:
+            relevant = [(key, cfg.get(key)) for key in self.cfg_keys]
+        try:
+            relevant = pickle.dumps(relevant, protocol=4)
+        except Exception as e:
+            raise Exception("the cache requires a picklable `cfg`, or `cfg_keys`: {}".format(e))
+
+        cache = ResultCache.__new__(ResultCache)
+        cache.__dict__.update(self.__dict__)
+        digest = hashlib.sha256()
+        for part in (runner_class.__module__, runner_class.__qualname__, self.version):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        digest.update(relevant)
+        cache.namespace = digest.hexdigest()
+        if self.max_bytes is not None:
+            cache._size = (context or mp).Value("q", -1)
+        return cache
+
+    def _file(self, data):
+        """
+        Returns:
+            str or None: path of the file of the result of `data`, None if `data` can not be hashed.
+        """
+        try:
+            key = pickle.dumps(data, protocol=4)
+        except Exception:
+            return None
+        digest = hashlib.sha256(self.namespace.encode())
+        digest.update(key)
+        name = digest.hexdigest()
+        return os.path.join(self.path, name[:2], name + self._SUFFIX)
+
+    def get(self, data):
+        """
+        Args:
+            data (Any): input of `producer_work`.
+
+        Returns:
+            tuple: whether the result of `data` is cached, and the result.
+        """
+        file = self._file(data)
+        if file is None:
+            return False, None
+        try:
+            with open(file, "rb") as f:
+                result = pickle.load(f)
+        except OSError:
+            return False, None
+        except Exception:
+            # a corrupted result, or one of a class which is gone or changed, is computed again
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+            return False, None
+        try:
+            # mark as recently used
+            os.utime(file)
+        except OSError:
+            pass
+        return True, result
+
+    def put(self, data, result):
+        """
+        Cache `result` of `data`. Unpicklable data or results are not cached.
+        """
+        file = self._file(data)
+        if file is None:
+            return
+        try:
+            content = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        directory = os.path.dirname(file)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(temp, file)
+        except OSError:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            return
+
+        if self.max_bytes is not None:
+            with self._size.get_lock():
+                if self._size.value < 0:
+                    self._size.value = self.size()
+                else:
+                    self._size.value += len(content)
+                if self._size.value > self.max_bytes:
+                    self._size.value = self.evict(int(self.max_bytes * self._EVICT_RATIO))
+
+    def _entries(self):
+        """
+        Returns:
+            list[tuple]: last use time, size and path of each cached result.
+        """
+        entries = []
+        for directory in os.scandir(self.path):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if not entry.name.endswith(self._SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        """
+        Returns:
+            int: bytes of the cached results of all runners.
+        """
+        return sum(size for time, size, path in self._entries())
+
+    def evict(self, max_bytes:int):
+        """
+        Remove the least recently used results until they take at most `max_bytes`.
+
+        Returns:
+            int: bytes of the remaining results.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for time, size, path in entries)
+        for time, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        return total
+
+    def clear(self):
+        """
+        Remove all cached results.
+        """
+        self.evict(0)
@@ -0,0 +1,389 @@
+import itertools
+import queue
+import secrets
+import threading
+import time
+import traceback
+from multiprocessing.connection import Listener, Client
+from easycore.common.config import CfgNode as CN
+from easycore.common.parallel.engine import OrderedRunner
+
+__all__ = ["DistributedRunner", "run_agent"]
+
+
+def _parse_address(address):
+    """
+    Args:
+        address (str or tuple): "host:port" or (host, port) for TCP, or a path for a Unix socket.
+
+    Returns:
+        str or tuple: address accepted by `multiprocessing.connection`.
+    """
+    if isinstance(address, str) and ":" in address:
+        host, port = address.rsplit(":", 1)
+        return (host, int(port))
+    if isinstance(address, list):
+        return tuple(address)
+    return address
+
+
+def _authkey(authkey):
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+class DistributedRunner:
+    """
+    A runner whose producers are agents connected over TCP or Unix sockets, possibly on other
+    machines. The runner listens on `address`, each agent connecting to it is sent the runner class
+    and `cfg`, runs `producer_init` and then `producer_work` on the chunks dispatched to it. The
+    consumer functions run in this process like with local runners.
+
+    Agents are started with ``easycore-agent --address host:port --devices cpu cpu`` (one agent
+    per device, with the key in the ``EASYCORE_AUTHKEY`` environment variable) or `run_agent`. They can connect and leave at any time: chunks are
+    dispatched to the connected agents, and the chunks of an agent whose connection is lost are
+    dispatched again to the others.
+    """
+
+    class _ErrorToken:
+        def __init__(self, error):
+            self.error = error
+
+    # seconds between two checks of an agent connection for new chunks or a closed runner.
+    _POLL_INTERVAL = 0.05
+
+    # number of agents which can wait to be accepted at once.
+    _BACKLOG = 64
+
+    def __init__(self,
+                 runner_class,
+                 address,
+                 cfg = CN(),
+                 authkey = None,
+                 ordered = None,
+                 chunksize = 1,
+                 max_inflight = 64,
+                 agent_inflight = 2,
+                 agent_timeout = 60.0):
+        """
+        Args:
+            runner_class (type): subclass of `BaseRunner` defining the producer and consumer
+                functions. It is sent to agents by reference, so agents must be able to import it.
+            address (str or tuple): address to listen on, "host:port" or (host, port) for TCP
+                (port 0 picks a free port, see `address` attribute), or a path for a Unix socket.
+            cfg (easycore.common.config.CfgNode): user custom data, sent to agents.
+            authkey (str or bytes or None): key agents must present to connect. Messages are
+                unpickled, so anyone able to connect can run code in this process: None generates
+                a random key for TCP addresses (see `authkey` attribute), and is only kept for Unix
+                sockets, protected by the permissions of their path.
+            ordered (bool or None): whether the consumer receives data in the order of the input.
+                None means it does if `runner_class` is an `OrderedRunner`.
+            chunksize (int): number of data sent to an agent at once.
+            max_inflight (int): maximum number of chunks dispatched but not received yet.
+            agent_inflight (int): number of chunks sent to an agent ahead of its results, so that
+                it does not wait for the network between chunks.
+            agent_timeout (float or None): seconds a call waits while no agent is connected before
+                it raises. None means it waits for agents forever.
+        """
+        self.runner_class = runner_class
+        self.cfg = cfg
+        if ordered is None:
+            ordered = issubclass(runner_class, OrderedRunner)
+        self.ordered = ordered
+        for name, value in (("chunksize", chunksize), ("max_inflight", max_inflight), ("agent_inflight", agent_inflight)):
+            if not (isinstance(value, int) and value >= 1):
+                raise Exception("parameter `{}` must be a positive int.".format(name))
+        self.chunksize = chunksize
+        self.max_inflight = max_inflight
+        self.agent_inflight = agent_inflight
+        if agent_timeout is not None and not (isinstance(agent_timeout, (int, float)) and agent_timeout >= 0):
+            raise Exception("parameter `agent_timeout` must be a non-negative number or None.")
+        self.agent_timeout = agent_timeout
+        address = _parse_address(address)
+        if authkey is None and isinstance(address, tuple):
+            authkey = secrets.token_hex(16)
+        # key agents must present, pass it to them
+        self.authkey = authkey
+        self._authkey = _authkey(authkey)
+
+        self._listener = Listener(address, backlog=self._BACKLOG, authkey=self._authkey)
+        self._tasks = queue.Queue()
+        self._results = queue.Queue()
+        self._closed = threading.Event()
+        self._agents_condition = threading.Condition()
+        # devices of connected agents
+        self._agents = {}
+        self._agent_threads = []
+        self._agent_ids = itertools.count()
+        self._acceptor = threading.Thread(target=self._accept, daemon=True)
+        self._acceptor.start()
+
+    @property
+    def address(self):
+        """ address the runner listens on, with the actual port if port 0 was given. """
+        return self._listener.address
+
+    @property
+    def num_agents(self):
+        """ number of connected agents. """
+        with self._agents_condition:
+            return len(self._agents)
+
+    def wait_agents(self, count:int, timeout:float = None):
+        """
+        Block until at least `count` agents are connected.
+
+        Returns:
+            bool: False if `timeout` seconds passed before.
+        """
+        with self._agents_condition:
+            return self._agents_condition.wait_for(lambda: len(self._agents) >= count, timeout)
+
+    def _accept(self):
+        """
+        Thread accepting agents until the runner is closed.
+        """
+        while not self._closed.is_set():
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                # closed listener or failed handshake
+                continue
+            thread = threading.Thread(target=self._serve, args=(conn, next(self._agent_ids)), daemon=True)
+            self._agent_threads.append(thread)
+            thread.start()
+
+    def _serve(self, conn, agent_id):
+        """
+        Thread sending chunks to an agent and receiving its results. If the connection is lost,
+        the chunks the agent did not finish are dispatched again.
+        """
+        outstanding = {}
+        try:
+            conn.send(("init", self.runner_class, self.cfg))
+            kind, device = conn.recv()
+            with self._agents_condition:
+                self._agents[agent_id] = device
+                self._agents_condition.notify_all()
+
+            while not (self._closed.is_set() and len(outstanding) == 0):
+                while len(outstanding) < self.agent_inflight and not self._closed.is_set():
+                    try:
+                        id, chunk = self._tasks.get_nowait() if len(outstanding) else self._tasks.get(timeout=self._POLL_INTERVAL)
+                    except queue.Empty:
+                        break
+                    outstanding[id] = chunk
+                    conn.send(("task", id, chunk))
+                if len(outstanding) and conn.poll(self._POLL_INTERVAL):
+                    message = conn.recv()
+                    if message[0] == "result":
+                        id, results = message[1], message[2]
+                        del outstanding[id]
+                        self._results.put((id, results))
+                    else:
+                        del outstanding[message[1]]
+                        self._results.put(self._ErrorToken(Exception(
+                            "producer_work failed on agent {} ({}):\n{}".format(agent_id, device, message[2]))))
+            conn.send(("stop",))
+        except (EOFError, OSError):
+            # lost agent, dispatch its chunks again
+            for task in outstanding.items():
+                self._tasks.put(task)
+        finally:
+            with self._agents_condition:
+                self._agents.pop(agent_id, None)
+                self._agents_condition.notify_all()
+            conn.close()
+
+    def _iter_chunks(self, data_iter):
+        chunk = []
+        for data in data_iter:
+            chunk.append(data)
+            if len(chunk) >= self.chunksize:
+                yield chunk
+                chunk = []
+        if len(chunk):
+            yield chunk
+
+    def _iterate(self, data_iter, ordered):
+        """
+        Dispatch chunks of `data_iter` to agents.
+
+        Yields:
+            Any: results of `producer_work`, in the order of `data_iter` if `ordered`.
+        """
+        if self._closed.is_set():
+            raise Exception("The runner is closed.")
+
+        chunks = self._iter_chunks(data_iter)
+        put_id = 0
+        get_id = 0
+        reorder_buffer = {}
+        inflight = 0
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and inflight < self.max_inflight:
+                    try:
+                        chunk = next(chunks)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    self._tasks.put((put_id, chunk))
+                    put_id += 1
+                    inflight += 1
+                if inflight == 0:
+                    break
+
+                data = self._get_result()
+                if isinstance(data, self._ErrorToken):
+                    inflight -= 1
+                    raise data.error
+                id, results = data
+                inflight -= 1
+                if not ordered:
+                    yield from results
+                    continue
+                reorder_buffer[id] = results
+                while get_id in reorder_buffer:
+                    yield from reorder_buffer.pop(get_id)
+                    get_id += 1
+        finally:
+            # withdraw chunks not sent yet and drain results of an abandoned iteration, chunks of
+            # lost agents are given back to `_tasks` before the agents are removed
+            while inflight > 0:
+                try:
+                    self._tasks.get_nowait()
+                    inflight -= 1
+                    continue
+                except queue.Empty:
+                    pass
+                try:
+                    self._results.get(timeout=self._POLL_INTERVAL)
+                    inflight -= 1
+                except queue.Empty:
+                    if self.num_agents == 0 and self._tasks.empty():
+                        break
+
+    def _get_result(self):
+        """
+        Returns:
+            tuple or _ErrorToken: id and results of a chunk, or the error of a chunk.
+
+        Raises:
+            Exception: if no agent is connected for `agent_timeout` seconds.
+        """
+        idle_since = None
+        while True:
+            try:
+                return self._results.get(timeout=self._POLL_INTERVAL)
+            except queue.Empty:
+                pass
+            if self.num_agents > 0:
+                idle_since = None
+            elif idle_since is None:
+                idle_since = time.time()
+            elif self.agent_timeout is not None and time.time() - idle_since >= self.agent_timeout:
+                raise Exception("no agent connected to the runner at {} for {} seconds.".format(
+                    self.address, self.agent_timeout))
+
+    def __call__(self, data_iter):
+        """
+        Args:
+            data_iter (Iterable): iterator of data
+
+        Returns:
+            Any: result of `consumer_end`.
+        """
+        cfg = self.cfg.copy()
+        self.runner_class.consumer_init(cfg)
+        for data in self._iterate(data_iter, self.ordered):
+            self.runner_class.consumer_work(cfg, data)
+        return self.runner_class.consumer_end(cfg)
+
+    def imap(self, data_iter):
+        """
+        Lazily iterate results of `producer_work` in the order of `data_iter`.
+        The consumer functions are not called.
+
+        Args:
+            data_iter (Iterable): iterator of data
+
+        Yields:
+            Any: processed data of each data in `data_iter`.
+        """
+        return self._iterate(data_iter, True)
+
+    def imap_unordered(self, data_iter):
+        """
+        Lazily iterate results of `producer_work` as soon as they are completed.
+        The consumer functions are not called.
+
+        Args:
+            data_iter (Iterable): iterator of data
+
+        Yields:
+            Any: processed data of each data in `data_iter`.
+        """
+        return self._iterate(data_iter, False)
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """
+        Stop all agents and stop listening.
+        """
+        if not hasattr(self, "_closed") or self._closed.is_set():
+            return
+        self._closed.set()
+        self._listener.close()
+        for thread in self._agent_threads:
+            thread.join()
+
+
+def run_agent(address, authkey = None, device = "cpu", retry_timeout:float = 30.0):
+    """
+    Connect to a `DistributedRunner` and run its producer functions until the runner is closed.
+
+    Args:
+        address (str or tuple): address of the runner, "host:port" or (host, port) for TCP, or a
+            path for a Unix socket.
+        authkey (str or bytes or None): key of the runner, see `DistributedRunner.authkey`. It is
+            required for TCP addresses, agents unpickle what the runner sends.
+        device (str): device passed to the producer functions.
+        retry_timeout (float): seconds to retry connecting while the runner is not listening yet.
+    """
+    address = _parse_address(address)
+    if authkey is None and isinstance(address, tuple):
+        raise Exception("parameter `authkey` is required for TCP addresses.")
+    deadline = time.time() + retry_timeout
+    while True:
+        try:
+            conn = Client(address, authkey=_authkey(authkey))
+            break
+        except (ConnectionError, FileNotFoundError):
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+    try:
+        kind, runner_class, cfg = conn.recv()
+        runner_class.producer_init(device, cfg)
+        conn.send(("ready", device))
+        while True:
+            message = conn.recv()
+            if message[0] == "stop":
+                break
+            id, chunk = message[1], message[2]
+            try:
+                results = [runner_class.producer_work(device, cfg, data) for data in chunk]
+            except Exception:
+                conn.send(("error", id, traceback.format_exc()))
+            else:
+                conn.send(("result", id, results))
+        runner_class.producer_end(device, cfg)
+    except EOFError:
+        # the runner is gone
+        pass
+    finally:
+        conn.close()
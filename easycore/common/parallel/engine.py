@@ -2,18 +2,99 @@ import multiprocessing as mp
 import threading
 import queue
 import atexit
-import bisect
+import json
+import asyncio
+import collections
+import hashlib
+import math
+import os
+import pickle
+import secrets
+import time
+import traceback
 from typing import Callable, Iterable, Any
 from easycore.common.config import CfgNode as CN
+from easycore.common.parallel.transport import SharedMemoryReader, _ProducerTransport, _RunnerTransport
+from easycore.common.parallel.metrics import RunnerMetrics, export_stats, start_profiler, stop_profiler, load_profile, \
+    _trace_event, _trace_async_event, _trace_thread_name
+from easycore.common.parallel.cache import ResultCache
+from easycore.common.parallel.scheduling import _ProducerScheduling, _RunnerScheduling
+from easycore.common.parallel.recovery import _MAX_HELD_CHUNKS, _ProducerRecovery, _RunnerRecovery
+from easycore.common.parallel.batching import _ProducerBatching, _RunnerBatching
+from easycore.common.parallel.affinity import POLICIES as AFFINITY_POLICIES, available_cpus, numa_nodes, worker_cpus
 
 
-class BaseRunner:
+def _set_future_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_future_exception(future, exception):
+    if not future.done():
+        future.set_exception(exception)
+
+
+async def _aiterate(data_iter):
+    if hasattr(data_iter, "__aiter__"):
+        async for data in data_iter:
+            yield data
+    else:
+        for data in data_iter:
+            yield data
+
+
+class _WarmPool:
+    """
+    Producers parked by `BaseRunner.close(keep_warm=True)` with their queues, adopted by the next
+    runner activated with the same key, see `BaseRunner._pool_key`.
+    """
+    # attributes of a runner moved with the producers
+    ATTRS = ("producer_input_queue", "producer_input_queues", "_steal_queues", "producer_output_queue",
+             "_dispatch_blocked", "_queue_loads", "_queue_items", "_worker_item_times", "_shm_release_queues",
+             "_shm_prefixes", "_shm_reader", "producers", "_worker_slots", "_worker_active", "_active_workers")
+
+    def __init__(self, runner):
+        self.scheduler = runner.scheduler
+        self.state = {name: getattr(runner, name) for name in self.ATTRS}
+
+    def adopt(self, runner):
+        for name, value in self.state.items():
+            setattr(runner, name, value)
+        # ids start again in the new runner, forget the chunks held by producers
+        if runner.max_restarts > 0:
+            for index in runner._active_workers:
+                runner._worker_slots[index][1] = 0
+
+    def stop(self):
+        state = self.state
+        for index in state["_active_workers"]:
+            if self.scheduler == "shared":
+                state["producer_input_queue"].put(BaseRunner._Producer._StopToken())
+            else:
+                state["producer_input_queues"][index].put(BaseRunner._Producer._StopToken())
+        for producer in state["producers"]:
+            producer.join()
+        if state["_shm_reader"] is not None:
+            state["_shm_reader"].close()
+
+
+# parked pools keyed by `BaseRunner._pool_key`
+_warm_pools = {}
+_warm_pools_lock = threading.Lock()
+
+
+class BaseRunner(_RunnerScheduling, _RunnerRecovery, _RunnerBatching, _RunnerTransport):
     """
     A Multi-process runner whose consumer receive data in unorder. 
     The runner will start multi-processes for producers and 1 thread for consumer.
     """
 
-    class _Producer(mp.Process):
+    class _Producer(_ProducerScheduling, _ProducerRecovery, _ProducerBatching, _ProducerTransport):
+        """
+        Work loop of a producer, run in a process or a thread depending on the backend. The
+        arguments of scheduling, recovery, batching and transport are set by the `_setup_*`
+        methods of the base classes before the producer is started.
+        """
         def __init__(self,
                      input_queue,
                      output_queue,
@@ -21,8 +102,17 @@ class BaseRunner:
                      cfg,
                      init_func,
                      work_func,
-                     end_func):
-            super(BaseRunner._Producer, self).__init__()
+                     end_func,
+                     index = 0,
+                     combine_func = None,
+                     combine_interval = None,
+                     metrics = False,
+                     report_queue = None,
+                     trace = False,
+                     trace_pid = None,
+                     profile = False,
+                     cpus = None,
+                     cache = None):
             self.input_queue = input_queue
             self.output_queue = output_queue
             self.device = device
@@ -30,9 +120,181 @@ class BaseRunner:
             self.init_func = init_func
             self.work_func = work_func
             self.end_func = end_func
+            self.index = index
+            self.combine_func = combine_func
+            self.combine_interval = combine_interval
+            # send timings with results
+            self.metrics = metrics
+            # queue to send trace events and profiles to the runner
+            self.report_queue = report_queue
+            # record trace events, with the pid of the runner for events of the queues
+            self.trace = trace
+            self.trace_pid = trace_pid
+            self.profile = profile
+            # cpus this producer is pinned to, None if it is not pinned
+            self.cpus = cpus
+            # `ResultCache` bound to the runner, None if results are not cached
+            self.cache = cache
+
+        # functions serialized by value if the serializer supports it, see `__getstate__`
+        _FUNCTIONS = ("init_func", "work_func", "end_func", "combine_func")
+
+        def __getstate__(self):
+            # only called to send the producer to a spawned process
+            state = self.__dict__.copy()
+            if self.serializer is not None and self.serializer.serialize_functions:
+                state["_functions"] = self.serializer.dumps(tuple(state.pop(name) for name in self._FUNCTIONS))
+            return state
+
+        def __setstate__(self, state):
+            functions = state.pop("_functions", None)
+            self.__dict__.update(state)
+            if functions is not None:
+                for name, func in zip(self._FUNCTIONS, self.serializer.loads(functions)):
+                    setattr(self, name, func)
+
+        def _send_error(self, id, index, count, elapsed):
+            """
+            Send the traceback of the exception being handled in place of the results of a chunk,
+            the pending call raises it and the producer goes on with the next chunks.
+            """
+            error = Exception("producer_work failed on producer {} ({}):\n{}".format(
+                self.index, self.device, traceback.format_exc()))
+            token = BaseRunner._Consumer._ErrorToken(error, count)
+            self.output_queue.put((id, token, elapsed, index, count, 0, None))
+
+        def _work(self, id, chunk):
+            """
+            Returns:
+                list: `work_func` applied to each data in `chunk`.
+            """
+            work_func = self.work_func if self.cache is None else self._cached_work
+            if not self.trace:
+                return [work_func(self.device, self.cfg, data) for data in chunk]
+            results = []
+            for data in chunk:
+                start = time.time()
+                results.append(work_func(self.device, self.cfg, data))
+                self._events.append(_trace_event("producer_work", start, time.time(), self.index, {"chunk": id}))
+            return results
+
+        def _cached_work(self, device, cfg, data):
+            """
+            Returns:
+                Any: result of `work_func` on `data`, read from the cache if it is cached.
+            """
+            hit, result = self.cache.get(data)
+            if not hit:
+                result = self.work_func(device, cfg, data)
+                self.cache.put(data, result)
+            return result
+
+        def _flush_partial(self, shm_writer):
+            """
+            Send the partial aggregate of `combine_func` to the consumer.
+            """
+            self._send(shm_writer, self._ids, [self._partial], self._elapsed, self._sources, self._count,
+                       self._queue_wait)
+            self._partial = None
+            self._elapsed = 0.0
+            self._queue_wait = None
+            self._ids = []
+            self._sources = []
+            self._count = 0
 
         def run(self):
-            raise NotImplementedError("This is a base runner without implement.")
+            # pin before `init_func`, so that its memory is allocated on the node of the cpus
+            if self.cpus is not None:
+                os.sched_setaffinity(0, self.cpus)
+            if self.recoverable:
+                self._track_locks()
+
+            # initialization
+            profiler = start_profiler() if self.profile else None
+            self._events = []
+            if self.trace:
+                self._events.append(_trace_thread_name(self.index, "producer {} ({})".format(self.index, self.device)))
+                start = time.time()
+            self.init_func(self.device, self.cfg)
+            if self.trace:
+                self._events.append(_trace_event("producer_init", start, time.time(), self.index))
+            shm_writer = self._create_shm_writer()
+            # partial aggregate of `combine_func` not sent yet
+            self._partial = None
+            self._elapsed = 0.0
+            self._queue_wait = None
+            self._ids = []
+            self._sources = []
+            self._count = 0
+
+            while True:
+                if self._count:
+                    try:
+                        data, index = self._get_task(timeout=BaseRunner._COMBINE_WAIT)
+                    except queue.Empty:
+                        # no more data for now, flush the partial aggregate
+                        self._flush_partial(shm_writer)
+                        continue
+                else:
+                    data, index = self._get_task()
+                if isinstance(data, self._StopToken):
+                    break
+                if self.batch_size is not None:
+                    if self._work_batch(shm_writer, data, index):
+                        break
+                    continue
+
+                # decode data and do task, tasks carry the time they are dispatched with metrics
+                id, chunk = data[0], data[1]
+                queue_wait = time.time() - data[2] if len(data) > 2 else None
+                self._hold(id, index)
+                if self.trace and queue_wait is not None:
+                    self._events.append(_trace_async_event("input_queue", "b", data[2], self.trace_pid, id))
+                    self._events.append(_trace_async_event("input_queue", "e", time.time(), self.trace_pid, id))
+                start = time.perf_counter()
+                try:
+                    results = self._work(id, chunk)
+                    if self.combine_func is not None:
+                        # the partial aggregate is only updated if the whole chunk is combined
+                        partial = self._partial
+                        for data in results:
+                            partial = self.combine_func(self.device, self.cfg, partial, data)
+                except Exception:
+                    self._send_error(id, index, len(chunk), time.perf_counter() - start)
+                    continue
+
+                if self.combine_func is not None:
+                    self._partial = partial
+                    self._elapsed += time.perf_counter() - start
+                    if queue_wait is not None:
+                        self._queue_wait = (self._queue_wait or 0.0) + queue_wait
+                    self._ids.append(id)
+                    self._sources.append(index)
+                    self._count += len(results)
+                    if (self.combine_interval is not None and self._count >= self.combine_interval) or \
+                            len(self._ids) >= _MAX_HELD_CHUNKS // 2:
+                        self._flush_partial(shm_writer)
+                    continue
+
+                elapsed = time.perf_counter() - start
+                try:
+                    self._send(shm_writer, id, results, elapsed, index, len(results), queue_wait)
+                except Exception:
+                    # results which can not be serialized
+                    self._send_error(id, index, len(results), elapsed)
+
+            # end
+            if self.trace:
+                start = time.time()
+            self.end_func(self.device, self.cfg)
+            if self.trace:
+                self._events.append(_trace_event("producer_end", start, time.time(), self.index))
+                self.report_queue.put(("trace", self._events))
+            if profiler is not None:
+                self.report_queue.put(("profile", "producer{}".format(self.index), stop_profiler(profiler)))
+            if shm_writer is not None:
+                shm_writer.close()
+            self._mark_stopped()
 
         class _StopToken:
             pass
@@ -45,40 +307,311 @@ class BaseRunner:
                      cfg,
                      init_func,
                      work_func,
-                     end_func):
+                     end_func,
+                     release_func = None,
+                     merge_func = None,
+                     metrics = None,
+                     trace_events = None,
+                     profile = False,
+                     cpus = None):
             super(BaseRunner._Consumer, self).__init__(daemon=True)
             self.receive_func = receive_func
+            self.release_func = release_func
             self.input_queue = input_queue
             self.output_queue = output_queue
             self.cfg = cfg.copy()
             self.init_func = init_func
             self.work_func = work_func
             self.end_func = end_func
+            self.merge_func = merge_func
+            self.metrics = metrics
+            # list to append trace events
+            self.trace_events = trace_events
+            self.profile = profile
+            # raw stats of the profiler, set when the thread stops
+            self.profile_stats = None
+            # cpus this thread is pinned to, None if it is not pinned
+            self.cpus = cpus
+            # progress of the current call, see `expect`
+            self._condition = threading.Condition()
+            self._waiting = False
+            self.begin()
+
+        def _trace(self, name, start):
+            if self.trace_events is not None:
+                self.trace_events.append(_trace_event(name, start, time.time(), threading.get_ident()))
 
         def run(self):
-            raise NotImplementedError("This is a base runner without implement.")
+            if self.cpus is not None:
+                os.sched_setaffinity(0, self.cpus)
+            profiler = start_profiler() if self.profile else None
+            if self.trace_events is not None:
+                self.trace_events.append(_trace_thread_name(threading.get_ident(), "consumer"))
+            # with producer combiners, each received data is a partial aggregate
+            work_func = self.work_func if self.merge_func is None else self.merge_func
+            while True:
+                data = self.input_queue.get()
+                self.input_queue.task_done()
+                if isinstance(data, self._StopToken):
+                    if profiler is not None:
+                        self.profile_stats = stop_profiler(profiler)
+                    break
+                elif isinstance(data, self._InitToken):
+                    # initialization
+                    cfg = self.cfg.copy()
+                    start = time.time()
+                    self.init_func(cfg)
+                    self._trace("consumer_init", start)
+
+                    # work until all data dispatched in this call are received
+                    error = self._consume(cfg, work_func)
+
+                    # end
+                    if error is None:
+                        start = time.time()
+                        data = self.end_func(cfg)
+                        self._trace("consumer_end", start)
+                    else:
+                        data = self._ErrorToken(error)
+                    self.output_queue.put(data)
+                    del cfg
+
+        def begin(self):
+            """
+            Reset the counters for a new call, before the call puts an `_InitToken`.
+            """
+            # number of data dispatched in the current call, written by the dispatching thread only
+            self._expected = 0
+            self._ended = False
+            # exception raised by `producer_work` in the current call, the call stops dispatching
+            self.work_error = None
+
+        def expect(self, count):
+            """
+            Inform the consumer that `count` more data are dispatched. The lock is only taken
+            when the consumer waits, so that dispatching a chunk costs no queue operation.
+            """
+            self._expected += count
+            if self._waiting:
+                with self._condition:
+                    self._condition.notify()
+
+        def end(self):
+            """
+            Inform the consumer that all data of the current call are dispatched.
+            """
+            with self._condition:
+                self._ended = True
+                self._condition.notify()
+
+        def _consume(self, cfg, work_func):
+            """
+            Receive and consume results until all data are dispatched and received.
+
+            Returns:
+                Exception or None: error of producers, remaining data are skipped after it, or
+                    first exception raised by `producer_work`, remaining results are received
+                    but not consumed after it.
+            """
+            received = 0
+            error = None
+            while True:
+                if received >= self._expected:
+                    with self._condition:
+                        # `_waiting` is set before checking `_expected`, so `expect` either
+                        # notifies or has already increased `_expected`
+                        self._waiting = True
+                        while received >= self._expected and not self._ended:
+                            self._condition.wait()
+                        self._waiting = False
+                        if received >= self._expected:
+                            return error or self.work_error
+                if error is not None:
+                    # skip data, results of failed producers are not waited for
+                    received = self._expected
+                    continue
+
+                try:
+                    chunk, count = self.receive_func()
+                except Exception as e:
+                    # producers failed, skip the remaining data
+                    error = e
+                    continue
+                if isinstance(chunk, self._ErrorToken) and self.work_error is None:
+                    self.work_error = chunk.error
+                if self.work_error is not None:
+                    received += count
+                    if self.release_func is not None:
+                        self.release_func()
+                    continue
+                start = time.perf_counter()
+                for data in chunk:
+                    if self.trace_events is None:
+                        work_func(cfg, data)
+                    else:
+                        work_start = time.time()
+                        work_func(cfg, data)
+                        self._trace("consumer_work", work_start)
+                if self.metrics is not None:
+                    self.metrics.add("consume", time.perf_counter() - start, len(chunk))
+                received += count
+                if self.release_func is not None:
+                    self.release_func()
 
         class _InitToken:
             pass
 
-        class _EndToken:
-            pass   
-
         class _StopToken:
             pass
 
+        class _ErrorToken:
+            def __init__(self, error, count = 0):
+                self.error = error
+                # number of data whose results it replaces
+                self.count = count
+
+        class _RecoverToken:
+            def __init__(self, held):
+                self.held = held
+
+    # reorder window of the consumer, see `OrderedRunner`.
+    max_reorder = None
+
+    # seconds a producer waits for new data before flushing its partial aggregate.
+    _COMBINE_WAIT = 0.005
+
+    _BACKENDS = ("process", "thread")
+
+    # seconds to wait for stop tokens of the shared queue to be taken before parking producers.
+    _PARK_TIMEOUT = 1.0
+
+    # seconds between two checks of the feeder thread for an abandoned iteration.
+    _FEED_INTERVAL = 0.1
+
     def __init__(self,
                  devices,
                  cfg = CN(),
-                 queue_scale = 3.0):
+                 queue_scale = None,
+                 chunksize = 1,
+                 shared_memory = False,
+                 scheduler = "shared",
+                 backend = "process",
+                 combine_interval = None,
+                 min_workers = None,
+                 max_workers = None,
+                 max_inflight_bytes = 1 << 28,
+                 max_restarts = 3,
+                 metrics = False,
+                 trace = False,
+                 profile = False,
+                 prefetch = 0,
+                 start_method = None,
+                 preload = None,
+                 max_batch_size = None,
+                 max_wait_ms = 0,
+                 affinity = None,
+                 serializer = None,
+                 cache = None):
         """
         Args:
             devices (int or Iterable): If the `devices` is `int`, it will use devices cpu to do
                 the work. If the `devices` is an iterable object, such as list, it will use the
                 devices specified by the iterable object, such as ["cpu", "cuda:0", "cuda:1"].
             cfg (easycore.common.config.CfgNode): user custom data.
-            queue_scale (float): scale the queues for communication between processes.
+            queue_scale (float or None): number of chunks the queues hold for each producer (for
+                `max_workers` producers if it is set). None means the number of chunks in flight
+                is tuned from the measured time of each chunk, so that producers always have
+                chunks at hand despite the latency of the queues, without holding more than needed.
+            chunksize (int or str): number of data sent to a producer at once. If it is "auto",
+                the chunk size is adapted from the measured time of `producer_work`, so that each
+                chunk takes about `_AUTO_CHUNK_TIME` seconds and the tail of a sized input is
+                split into smaller chunks (guided self-scheduling).
+            shared_memory (bool): transfer numpy arrays returned by `producer_work` to the consumer
+                through pooled shared memory instead of pickling them. `consumer_work` receives
+                views of the shared memory which are recycled after it returns, so copy the arrays
+                you keep. `imap` and `imap_unordered` yield copies.
+            scheduler (str): how chunks are dispatched to producers. "shared": all producers get
+                chunks from one shared queue. "round_robin" and "least_loaded": each producer has
+                its own queue, chunks are dispatched in turn or to the producer with the fewest
+                unfinished chunks, and idle producers steal chunks from the queues of busy ones.
+                "throughput": each producer has its own queue, the time spent on each data is
+                measured online for each producer, and chunks are dispatched to the producer
+                expected to finish them first. The number of unfinished chunks of each producer is
+                limited in proportion to its throughput, so slow devices do not hold data that
+                fast devices could have finished.
+            backend (str): "process" runs each producer in a process. "thread" runs each producer
+                in a thread of this process without serializing data, which is cheaper for I/O
+                bound work or work releasing the GIL (numpy, file reading, HTTP).
+            combine_interval (int or None): if `producer_combine` is overridden, each producer
+                sends its partial aggregate to the consumer after combining this number of data,
+                or whenever it runs out of data. None means only the latter.
+            min_workers (int or None): lower bound of the number of producers.
+            max_workers (int or None): upper bound of the number of producers. If it is set, the
+                runner starts with `len(devices)` producers clamped to the bounds, and a thread adds
+                a producer when data wait in the input queues while the output queue is not backed
+                up and cpus are not saturated, and removes one after `_AUTOSCALE_IDLE_STEPS` seconds
+                without data. Producers are also added or removed explicitly by `resize`. Devices
+                of new producers are taken from `devices` in turn.
+            max_inflight_bytes (int or None): dispatching waits while the estimated bytes of the
+                chunks in flight exceed it (256 MiB by default). The size of a chunk is estimated
+                from the buffers of arrays, bytes and strings in its data, plus the average size of
+                the results observed so far. None means unlimited.
+            max_restarts (int): number of times producers which exit unexpectedly (killed by the
+                system, crashed in an extension) are restarted. A restarted producer runs
+                `producer_init` again and the chunks lost with the dead producer are dispatched again.
+                Beyond this number, the pending call raises an exception instead of waiting forever.
+                0 also skips recording the chunks and queue locks held by producers, which costs a
+                few microseconds per chunk, but a producer dying while it writes a result may then
+                leave the pending call waiting.
+                Exceptions raised by `producer_work` do not stop producers: the pending call raises
+                an exception with their traceback, and later calls work as usual.
+            metrics (bool): record the time spent in each stage (dispatching, waiting in the input
+                queue, `producer_work`, pickling, transit, unpickling, `consumer_work`) and the
+                utilization of each producer, see `stats`. Results are pickled explicitly in producers
+                to time the serialization, which costs an extra copy.
+            trace (bool): record an event for `producer_init`, each `producer_work` call, the transit
+                of each chunk through the queues and each `consumer_work` call, in all processes. See
+                `export_trace`.
+            profile (bool or str): profile each producer and the consumer with cProfile, see
+                `profile_stats`. If it is a path, the merged profile is written to it when the runner
+                is closed, along with a file for each worker, see `export_profile`.
+            prefetch (int): number of chunks read ahead from `data_iter` by a feeder thread, so that
+                a slow iterator (reading files, network) keeps producing data while dispatching
+                waits for room in the queues. 0 means reading `data_iter` in the calling thread.
+                The iterator is read by the feeder thread only.
+            start_method (str or None): start method of producer processes, "fork", "spawn" or
+                "forkserver". None means the default of the platform.
+            preload (list[str] or None): modules imported once by the forkserver, so that processes
+                forked from it start with them loaded. Only with `start_method="forkserver"`.
+            max_batch_size (int or None): if it is set, each producer gathers the data of the chunks
+                it takes until it has `max_batch_size` data, `max_wait_ms` passed since the first
+                one or the runner can not dispatch more data, and calls `producer_work` once with a
+                list of at most `max_batch_size` data.
+                `producer_work` must return a sequence of as many results (a list, or a tensor or
+                an array indexed along its first dimension), which are sent back per data in the
+                order of the input. None means `producer_work` is called on each data.
+            max_wait_ms (float): milliseconds a producer waits for more data to fill a batch.
+            affinity (str or list or None): pin each producer to cpus with `os.sched_setaffinity`
+                (Linux only). "spread" places producers on a cpu of each NUMA node in turn,
+                "compact" fills the cpus of a NUMA node before the next one. A list gives the cpus
+                (an int or a list of ints) of producer `i` at `i % len(affinity)`. The consumer
+                thread is kept off the cpus of the producers if other cpus are available. None
+                means producers run on any cpu.
+            serializer (str or Serializer or None): how chunks and results are serialized for the
+                queues to producer processes, see :mod:`easycore.common.parallel.serialization`.
+                "pickle5" keeps the buffers of numpy arrays out of the pickled bytes, "cloudpickle" also
+                serializes lambdas and closures, including the producer functions with the "spawn"
+                and "forkserver" start methods, "msgpack" is fast for plain data. None means the
+                queues pickle them.
+            cache (str or ResultCache or None): directory of an on-disk cache of the results of
+                `producer_work`, or a :class:`easycore.common.parallel.cache.ResultCache`. Producers
+                look results up by a hash of the runner class, `cfg` and the data before calling
+                `producer_work`, so reruns only compute the results of new data. None means results
+                are not cached.
         """
+        # set first, `__del__` closes runners whose arguments are rejected
+        self._is_activate = False
+
         # get devices
         if isinstance(devices, int):
             self.devices = ["cpu" for _ in range(devices)]
@@ -88,9 +621,71 @@ class BaseRunner:
             raise Exception("parameter `devices` must be int or Iterable.")
 
         self.cfg = cfg
-        self.queue_scale = queue_scale
+        self._init_scheduling(queue_scale, chunksize, scheduler, min_workers, max_workers, max_inflight_bytes)
+
+        if backend not in self._BACKENDS:
+            raise Exception("parameter `backend` must be one of {}.".format(self._BACKENDS))
+        self.backend = backend
+
+        # map-reduce mode, see `producer_combine`
+        self._combine = self.producer_combine is not BaseRunner.producer_combine
+        self.combine_interval = combine_interval
+
+        self._init_recovery(max_restarts)
+
+        self.metrics = metrics
+        self._metrics = None
+        self.trace = trace
+        self._trace_events = None
+        self.profile = profile
+        self._profiles = None
+
+        if not (isinstance(prefetch, int) and prefetch >= 0):
+            raise Exception("parameter `prefetch` must be a non-negative int.")
+        self.prefetch = prefetch
+
+        if start_method is not None and start_method not in mp.get_all_start_methods():
+            raise Exception("parameter `start_method` must be one of {}.".format(mp.get_all_start_methods()))
+        if preload is not None and start_method != "forkserver":
+            raise Exception("parameter `preload` requires `start_method=\"forkserver\"`.")
+        self.start_method = start_method
+        self.preload = preload
+        self._mp = mp.get_context(start_method)
+        if preload is not None:
+            self._mp.set_forkserver_preload(list(preload))
+
+        self._init_batching(max_batch_size, max_wait_ms)
+
+        if affinity is not None:
+            if not hasattr(os, "sched_setaffinity"):
+                raise Exception("parameter `affinity` is not supported on this platform.")
+            if isinstance(affinity, str):
+                if affinity not in AFFINITY_POLICIES:
+                    raise Exception("parameter `affinity` must be one of {} or a list.".format(AFFINITY_POLICIES))
+            elif not (isinstance(affinity, (list, tuple)) and len(affinity) > 0):
+                raise Exception("parameter `affinity` must be one of {} or a list.".format(AFFINITY_POLICIES))
+            else:
+                cpus = set(available_cpus())
+                for index in range(len(affinity)):
+                    if not worker_cpus(affinity, index) <= cpus:
+                        raise Exception("cpus of parameter `affinity` must be among the available cpus {}.".format(sorted(cpus)))
+        self.affinity = affinity
+        # NUMA nodes read once for automatic placement
+        self._numa_nodes = numa_nodes() if isinstance(affinity, str) else None
+
+        self._init_transport(shared_memory, serializer)
+
+        if cache is not None:
+            if isinstance(cache, str):
+                cache = ResultCache(cache)
+            elif not isinstance(cache, ResultCache):
+                raise Exception("parameter `cache` must be a path, a `ResultCache` or None.")
+            # keyed by the cfg given here, not the one modified by `producer_init`
+            self._cache = cache.bind(type(self), cfg, self._mp)
+        else:
+            self._cache = None
+        self.cache = cache
 
-        self._is_activate = False
         self.activate()
         
         atexit.register(self.close)
@@ -141,6 +736,26 @@ class BaseRunner:
         """
         pass
 
+    @staticmethod
+    def producer_combine(device, cfg, partial, data):
+        """
+        function to pre-aggregate processed data in the producer (optional). If it is overridden,
+        producers do not send each processed data to the consumer but partial aggregates, which
+        are merged by `consumer_merge` instead of `consumer_work`. Partial aggregates are merged in
+        arbitrary order, so the reduction must be associative and commutative.
+
+        Args:
+            device (str): device for this process.
+            cfg (easycore.common.config.CfgNode): config of this process.
+            partial (Any): partial aggregate of this producer, None for the first data after
+                the partial aggregate is sent.
+            data (Any): data returned by `producer_work`.
+
+        Returns:
+            Any: the new partial aggregate.
+        """
+        raise NotImplementedError
+
     @staticmethod
     def consumer_init(cfg):
         """
@@ -164,6 +779,19 @@ class BaseRunner:
         """
         pass
 
+    @staticmethod
+    def consumer_merge(cfg, partial):
+        """
+        function specify how the consumer merges a partial aggregate from `producer_combine`.
+
+        Args:
+            cfg (easycore.common.config.CfgNode): config of this process, you can use it to get data from
+                `consumer_init` function and transfer data to the next `consumer_merge` and `consumer_end`
+                function.
+            partial (Any): partial aggregate of a producer.
+        """
+        pass
+
     @staticmethod
     def consumer_end(cfg):
         """
@@ -188,49 +816,459 @@ class BaseRunner:
         """
         if not self.is_activate:
             raise Exception("The runner is closed. Please activate it.")
+        self._check_error()
+
+        self._reset_ids()
 
         # inform the consumer to initialize
+        self.consumer.begin()
         self._put_into_consumer(self._Consumer._InitToken())
 
-        # put data to producer
-        for data in data_iter:
-            self._put_into_producer(data)
-            self._put_into_consumer(None)  # inform the consumer to process 1 data
+        # put data to producer, the consumer receives results as long as fewer than the data
+        # dispatched so far are received
+        chunks = self._prefetch_chunks(data_iter)
+        try:
+            for chunk in chunks:
+                if self.consumer.work_error is not None:
+                    # the call fails, do not process the remaining data
+                    break
+                self._put_into_producer(chunk)
+                self.consumer.expect(len(chunk))
+        except BaseException:
+            # let the consumer finish with the data dispatched, its result is dropped
+            self.consumer.end()
+            try:
+                self._get_from_consumer()
+            except Exception:
+                pass
+            raise
+        finally:
+            chunks.close()
+
+        # inform the consumer that the total is known
+        self.consumer.end()
+
+        # get result from consumer, no more chunks are dispatched until it is got
+        self._dispatch_blocked.value = 1
+        try:
+            data = self._get_from_consumer()
+        finally:
+            self._dispatch_blocked.value = 0
+        return data
 
-        # inform the consumer to return result
-        self._put_into_consumer(self._Consumer._EndToken())
+    def imap(self, data_iter, max_inflight = None):
+        """
+        Lazily iterate results of `producer_work` in the order of `data_iter`.
+        The consumer functions are not called. With `shared_memory=True`, numpy arrays are copied
+        out of the shared memory, so the results stay valid after the next iteration.
 
-        # get result from consumer
-        data = self._get_from_consumer()
-        return data
+        Args:
+            data_iter (Iterable): iterator of data
+            max_inflight (int or None): maximum number of chunks dispatched but not yielded yet.
+                Default to the capacity of the producer input queue, which is tuned online if
+                `queue_scale` is None. It is at most `max_reorder` for an `OrderedRunner`.
+
+        Yields:
+            Any: processed data of each data in `data_iter`.
+        """
+        return self._imap(data_iter, True, max_inflight)
+
+    def imap_unordered(self, data_iter, max_inflight = None):
+        """
+        Lazily iterate results of `producer_work` as soon as they are completed.
+        The consumer functions are not called. With `shared_memory=True`, numpy arrays are copied
+        out of the shared memory, so the results stay valid after the next iteration.
+
+        Args:
+            data_iter (Iterable): iterator of data
+            max_inflight (int or None): maximum number of chunks dispatched but not yielded yet.
+                Default to the capacity of the producer input queue, which is tuned online if
+                `queue_scale` is None.
+
+        Yields:
+            Any: processed data of each data in `data_iter`.
+        """
+        return self._imap(data_iter, False, max_inflight)
+
+    def _imap(self, data_iter, ordered, max_inflight):
+        if not self.is_activate:
+            raise Exception("The runner is closed. Please activate it.")
+        self._check_error()
+        if self._combine:
+            raise Exception("`imap` does not support runners with `producer_combine`.")
+
+        if self.queue_scale is not None:
+            # results are read in this thread, so the number of chunks in flight must fit in the
+            # queues or producers may block on a full output queue while we block on a full input queue.
+            capacity = self._queue_size()
+            if max_inflight is None:
+                max_inflight = capacity
+            max_inflight = max(1, min(max_inflight, capacity))
+        elif max_inflight is None:
+            # limited by `_inflight_full` only
+            max_inflight = math.inf
+        if ordered and self.max_reorder is not None:
+            # chunks in flight are those dispatched ahead of the next one to yield
+            max_inflight = min(max_inflight, self.max_reorder)
+
+        self._reset_ids()
+        chunks = self._prefetch_chunks(data_iter)
+        inflight = 0
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and inflight < max_inflight and (inflight == 0 or not self._is_inflight_full()):
+                    try:
+                        chunk = next(chunks)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    self._send_chunk(chunk)
+                    inflight += 1
+                if inflight == 0:
+                    break
+
+                # results may be kept after the next iteration, arrays are copied out of shared memory
+                self._dispatch_blocked.value = 1
+                try:
+                    if ordered:
+                        chunk = self._get_chunk_in_order(copy=True)
+                    else:
+                        chunk = self._decode_chunk(self._receive_chunk()[1], copy=True)
+                finally:
+                    self._dispatch_blocked.value = 0
+                inflight -= 1
+                if isinstance(chunk, self._Consumer._ErrorToken):
+                    raise chunk.error
+                for data in chunk:
+                    yield data
+        finally:
+            try:
+                # drain results of an abandoned iteration, it stops if the runner failed
+                for chunk in self._reorder_buffer.values():
+                    self._decode_chunk(chunk)
+                inflight -= len(self._reorder_buffer)
+                self._reorder_buffer.clear()
+                for _ in range(inflight):
+                    self._decode_chunk(self._receive_chunk()[1])
+            finally:
+                self._release_from_consumer()
+                chunks.close()
+
+    async def submit(self, data):
+        """
+        Process a data by a producer without blocking the event loop.
+        The consumer functions are not called.
+
+        Args:
+            data (Any): data to process.
+
+        Returns:
+            Any: processed data returned by `producer_work`.
+        """
+        if not self.is_activate:
+            raise Exception("The runner is closed. Please activate it.")
+        self._check_error()
+        if self.shared_memory:
+            raise Exception("`submit` does not support runners with `shared_memory=True`.")
+        if self._combine:
+            raise Exception("`submit` does not support runners with `producer_combine`.")
+
+        loop = asyncio.get_event_loop()
+        if self._is_inflight_full():
+            await loop.run_in_executor(None, self._wait_inflight)
+        future = loop.create_future()
+        with self._async_lock:
+            id = self._put_id
+            self._put_id += 1
+            self._dispatched += 1
+            self._async_futures[id] = (loop, future)
+            if self._async_receiver is None:
+                self._async_receiver = threading.Thread(target=self._async_receive, daemon=True)
+                self._async_receiver.start()
+        self._charge_chunk(id, [data])
+
+        if self._metrics is None and self._trace_events is None:
+            task = (id, self._encode_chunk([data]))
+        else:
+            task = (id, self._encode_chunk([data]), time.time())
+        input_queue = self.producer_input_queues[self._select_queue(id)]
+        try:
+            input_queue.put_nowait(task)
+        except queue.Full:
+            await loop.run_in_executor(None, input_queue.put, task)
+        return await future
+
+    def amap(self, data_iter, max_inflight = None):
+        """
+        Asynchronously iterate results of `producer_work` in the order of `data_iter`.
+
+        Args:
+            data_iter (Iterable or AsyncIterable): iterator of data
+            max_inflight (int or None): maximum number of data submitted but not yielded yet.
+                Default to the capacity of the producer input queue.
+
+        Yields:
+            Any: processed data of each data in `data_iter`.
+        """
+        return self._amap(data_iter, True, max_inflight)
+
+    def amap_unordered(self, data_iter, max_inflight = None):
+        """
+        Asynchronously iterate results of `producer_work` as soon as they are completed.
+
+        Args:
+            data_iter (Iterable or AsyncIterable): iterator of data
+            max_inflight (int or None): maximum number of data submitted but not yielded yet.
+                Default to the capacity of the producer input queue.
+
+        Yields:
+            Any: processed data of each data in `data_iter`.
+        """
+        return self._amap(data_iter, False, max_inflight)
+
+    async def _amap(self, data_iter, ordered, max_inflight):
+        if max_inflight is None:
+            max_inflight = self._queue_size()
+        # the next data is read in its own task, so that results are yielded while it is awaited
+        inputs = _aiterate(data_iter)
+        next_input = None
+        exhausted = False
+        # futures of `submit` in the order of the data
+        pending = collections.deque()
+        try:
+            while True:
+                if ordered:
+                    while len(pending) and pending[0].done():
+                        yield pending.popleft().result()
+                else:
+                    for future in [future for future in pending if future.done()]:
+                        pending.remove(future)
+                        yield future.result()
+
+                if next_input is None and not exhausted and len(pending) < max_inflight:
+                    next_input = asyncio.ensure_future(inputs.__anext__())
+                waits = set(list(pending)[:1] if ordered else pending)
+                if next_input is not None:
+                    waits.add(next_input)
+                if not waits:
+                    break
+                await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+
+                if next_input is not None and next_input.done():
+                    try:
+                        data = next_input.result()
+                    except StopAsyncIteration:
+                        exhausted = True
+                    else:
+                        pending.append(asyncio.ensure_future(self.submit(data)))
+                    next_input = None
+        finally:
+            if next_input is not None:
+                next_input.cancel()
+            for future in pending:
+                future.cancel()
+
+    def _async_receive(self):
+        """
+        Resolve futures of `submit` with results from producers until no future is pending.
+        """
+        while True:
+            with self._async_lock:
+                if len(self._async_futures) == 0:
+                    self._async_receiver = None
+                    return
+
+            data = self.producer_output_queue.get()
+            if isinstance(data, (self._Producer._StopToken, self._Consumer._ErrorToken)):
+                break
+            if isinstance(data, self._Consumer._RecoverToken):
+                self._receive_recover_token(data)
+                continue
+            id, chunk, elapsed, index, count, nbytes, timing = data
+            self._finish_chunk(id, count, elapsed, index, nbytes)
+            if not isinstance(chunk, self._Consumer._ErrorToken):
+                chunk = self._deserialize(chunk, elapsed, count, timing)
+            if self._trace_events is not None:
+                self._trace_received(id)
+            with self._async_lock:
+                loop, future = self._async_futures.pop(id)
+            try:
+                if isinstance(chunk, self._Consumer._ErrorToken):
+                    loop.call_soon_threadsafe(_set_future_exception, future, chunk.error)
+                else:
+                    loop.call_soon_threadsafe(_set_future_result, future, chunk[0])
+            except RuntimeError:
+                # the event loop is closed
+                pass
+
+        # the runner is closed or producers failed
+        error = data.error if isinstance(data, self._Consumer._ErrorToken) else Exception("The runner is closed.")
+        with self._async_lock:
+            for loop, future in self._async_futures.values():
+                try:
+                    loop.call_soon_threadsafe(_set_future_exception, future, error)
+                except RuntimeError:
+                    pass
+            self._async_futures.clear()
+            self._async_receiver = None
+
+    def stats(self):
+        """
+        Timings of the runner since it is activated, only available with `metrics=True`.
+
+        Returns:
+            dict: with keys "elapsed", "stages" and "workers", see
+                :meth:`easycore.common.parallel.metrics.RunnerMetrics.stats`.
+        """
+        if self._metrics is None:
+            raise Exception("stats are only recorded with `metrics=True`.")
+        return self._metrics.stats()
+
+    def export_stats(self, path:str, format:str = None):
+        """
+        Write `stats` to a file.
+
+        Args:
+            path (str): path of the file.
+            format (str or None): "prometheus" for the Prometheus text format or "json". None means
+                "json" for paths ending with ".json" and "prometheus" otherwise.
+        """
+        export_stats(self.stats(), path, format)
+
+    def export_trace(self, path:str):
+        """
+        Write the events recorded with `trace=True` to a file of the Chrome trace event format,
+        which can be opened by Perfetto (https://ui.perfetto.dev) or chrome://tracing. Close the
+        runner before to include `producer_end` events.
+
+        Args:
+            path (str): path of the json file.
+        """
+        if self._trace_events is None:
+            raise Exception("events are only recorded with `trace=True`.")
+        with open(path, "w") as f:
+            json.dump({"traceEvents": list(self._trace_events), "displayTimeUnit": "ms"}, f)
+
+    def profile_stats(self, worker:str = None):
+        """
+        Profiles are sent by producers when they stop, so close the runner before reading them.
+        A producer that dies abruptly loses its profile.
+
+        Args:
+            worker (str or None): "producer{index}" or "consumer", see `profile_workers`. None means
+                all workers merged.
+
+        Returns:
+            pstats.Stats:
+        """
+        if self._profiles is None:
+            raise Exception("profiles are only recorded with `profile` enabled.")
+        if worker is not None:
+            return self._profiles[worker]
+        return load_profile(*[stats.stats for stats in self._profiles.values()])
+
+    def profile_workers(self):
+        """
+        Returns:
+            list[str]: names of the profiled workers.
+        """
+        if self._profiles is None:
+            raise Exception("profiles are only recorded with `profile` enabled.")
+        return sorted(self._profiles)
+
+    def export_profile(self, path:str):
+        """
+        Write the merged profile to `path` and the profile of each worker to `path` suffixed with
+        "." and the worker name (e.g. "run.prof.producer0"). Files can be read by `pstats.Stats`
+        or viewers such as snakeviz.
+
+        Args:
+            path (str): path of the merged profile.
+        """
+        self.profile_stats().dump_stats(path)
+        for worker in self.profile_workers():
+            self._profiles[worker].dump_stats("{}.{}".format(path, worker))
 
     def __del__(self):
         self.close()
 
-    def close(self):
+    def close(self, keep_warm:bool = False):
         """
         Shutdown all processes if this runner is alive.
+
+        Args:
+            keep_warm (bool): park the producers instead of stopping them, so that the next runner
+                of the same class activated with the same devices, cfg and options in this process
+                (this runner included) takes them over without running `producer_init` again.
+                Parked producers are stopped by `clear_warm_pools` or at exit. Producers are
+                stopped anyway if a call is pending, a producer failed, or `trace` or `profile`
+                is enabled, since their reports are collected when they stop.
         """
         if self.is_activate:
             self._is_activate = False
+            if self._autoscaler is not None:
+                self._autoscale_stop.set()
+                self._autoscaler.join()
+            self._watch_stop.set()
+            self._watcher.join()
+
             # stop workers
-            for _ in self.devices:
-                self.producer_input_queue.put(self._Producer._StopToken())
+            with self._resize_lock:
+                park = keep_warm and self._can_park()
+                if not park:
+                    self._reap_workers()
+                    if self.scheduler == "shared":
+                        for _ in range(self.num_workers):
+                            self.producer_input_queue.put(self._Producer._StopToken())
+                    else:
+                        for index in self._active_workers:
+                            self.producer_input_queues[index].put(self._Producer._StopToken())
             self.consumer_input_queue.put(self._Consumer._StopToken())
 
             # join workers
-            for producer in self.producers:
-                producer.join()
+            if not park:
+                for producer in self.producers:
+                    producer.join()
             self.consumer.join()
+            if self.consumer.profile_stats is not None:
+                self._add_profile("consumer", self.consumer.profile_stats)
+            if self._report_collector is not None:
+                self._report_queue.put(self._Producer._StopToken())
+                self._report_collector.join()
+            with self._async_lock:
+                async_receiver = self._async_receiver
+            if async_receiver is not None:
+                self.producer_output_queue.put(self._Producer._StopToken())
+                async_receiver.join()
 
             # delete resources
-            del self.producer_input_queue
+            if park:
+                with _warm_pools_lock:
+                    _warm_pools.setdefault(self._pool_key(), []).append(_WarmPool(self))
+            elif self._shm_reader is not None:
+                self._shm_reader.close()
+            del self._shm_reader, self._shm_release_queues, self._shm_prefixes
+            del self._put_id, self._get_id, self._reorder_buffer, self._reorder_condition
+            del self._item_time, self._chunk_time
+            del self._inflight_chunks, self._inflight_bytes, self._chunk_nbytes, self._result_nbytes
+            del self._async_lock, self._async_futures, self._async_receiver
+            del self.producer_input_queue, self.producer_input_queues, self._steal_queues
+            del self._queue_loads, self._queue_items, self._worker_item_times, self._load_condition
+            del self._worker_active, self._active_workers, self._pending_stops, self._resize_lock
+            del self._dispatched, self._autoscaler, self._autoscale_stop
+            del self._pending_chunks, self._restarts, self._error, self._worker_slots
+            del self._watcher, self._watch_stop
+            del self._report_queue, self._report_collector
             del self.producer_output_queue
             del self.consumer_input_queue
             del self.consumer_output_queue
             del self.producers
             del self.consumer
 
+            if isinstance(self.profile, str):
+                self.export_profile(self.profile)
+
 
     def activate(self):
         """
@@ -238,24 +1276,113 @@ class BaseRunner:
         """
         if not self.is_activate:
             self._is_activate = True
-            # init queues for communication between processes
-            self.producer_input_queue = mp.Queue(maxsize = int(len(self.devices) * self.queue_scale))
-            self.producer_output_queue = mp.Queue(maxsize = int(len(self.devices) * self.queue_scale))
-            self.consumer_input_queue = queue.Queue(maxsize = int(len(self.devices) * self.queue_scale))
+            self._put_id = 0
+            self._get_id = 0
+            # chunks received ahead of `_get_id`, keyed by id
+            self._reorder_buffer = {}
+            self._reorder_condition = threading.Condition()
+            self._item_time = None
+            # moving average of time spent on each chunk by producers, None if not measured
+            self._chunk_time = None
+            # number and estimated bytes of chunks dispatched but not received yet
+            self._inflight_chunks = 0
+            self._inflight_bytes = 0
+            self._chunk_nbytes = {}
+            # moving average of estimated bytes of each result
+            self._result_nbytes = 0.0
+            # chunks dispatched but not received yet keyed by id, to dispatch them again if their
+            # producer dies
+            self._pending_chunks = {}
+            self._restarts = 0
+            # exception raised by pending and later calls after producers failed
+            self._error = None
+            # kept after closing, so that stats of a finished job can be read
+            self._metrics = RunnerMetrics() if self.metrics else None
+            # trace events of all processes, kept after closing
+            if self.trace:
+                self._trace_events = [_trace_thread_name(threading.get_ident(), "runner")]
+            else:
+                self._trace_events = None
+            # pstats.Stats of each worker, kept after closing
+            self._profiles = {} if self.profile else None
+            # futures of `submit` keyed by id, resolved by the receiver thread
+            self._async_lock = threading.Lock()
+            self._async_futures = {}
+            self._async_receiver = None
+
+            # init queues for communication between processes, queues of producers are created
+            # along with producers by `_add_worker`.
+            self._queue_class = self._mp.Queue if self.backend == "process" else queue.Queue
+            # with `queue_scale` None, queues are unbounded and chunks in flight are limited on dispatching
+            maxsize = self._queue_size() if self.queue_scale is not None else 0
+            self._load_condition = threading.Condition()
+            # producers parked by a runner closed with `keep_warm=True`, they come with their queues
+            with _warm_pools_lock:
+                pools = _warm_pools.get(self._pool_key())
+                pool = pools.pop() if pools else None
+            if pool is None:
+                if self.scheduler == "shared":
+                    self.producer_input_queue = self._queue_class(maxsize = maxsize)
+                else:
+                    self.producer_input_queue = None
+                self.producer_input_queues = []
+                # queues idle producers steal from, None if producers do not steal
+                self._steal_queues = self.producer_input_queues if self.scheduler in ("round_robin", "least_loaded") else None
+                # number of unfinished chunks and data dispatched to each queue
+                self._queue_loads = []
+                self._queue_items = []
+                # moving average of time spent on each data by each producer, None if not measured
+                self._worker_item_times = []
+                self.producer_output_queue = self._queue_class(maxsize = maxsize)
+                # set while no chunk can be dispatched, see `_ProducerBatching._work_batch`
+                self._dispatch_blocked = self._mp.RawValue("b", 0)
+            # only carries a token for each call, results are received by the consumer directly
+            self.consumer_input_queue = queue.Queue()
             self.consumer_output_queue = queue.Queue(maxsize = 1)
-
-            # create workers
-            self.producers = []
-            for device in self.devices:
-                self.producers.append(
-                    self._Producer(
-                        self.producer_input_queue,
-                        self.producer_output_queue,
-                        device,
-                        self.cfg,
-                        self.producer_init,
-                        self.producer_work,
-                        self.producer_end))
+            if self.trace or self.profile:
+                # producers send their trace events after each chunk, and their profile when they stop
+                self._report_queue = self._queue_class()
+                self._report_collector = threading.Thread(target=self._collect_reports, daemon=True)
+                self._report_collector.start()
+            else:
+                self._report_queue = None
+                self._report_collector = None
+            if pool is None:
+                self._shm_release_queues = []
+                # prefix of the segments of each worker, to unlink them if it dies
+                self._shm_prefixes = []
+                if self.shared_memory:
+                    self._shm_reader = SharedMemoryReader(self._shm_release_queues)
+                else:
+                    self._shm_reader = None
+
+                # create workers, a worker keeps its index after it is stopped by `resize`, and the index
+                # is reused by the next new worker.
+                self.producers = []
+                self._worker_slots = []
+                self._worker_active = []
+                # indexes of active workers, chunks are only dispatched to them
+                self._active_workers = []
+            else:
+                pool.adopt(self)
+                if self._metrics is not None:
+                    for index in self._active_workers:
+                        self._metrics.start_worker(index, self.devices[index % len(self.devices)])
+            # number of stop tokens in the shared queue not taken by a worker yet
+            self._pending_stops = 0
+            self._resize_lock = threading.Lock()
+            # number of chunks dispatched or submitted since activation, to detect idleness
+            self._dispatched = 0
+            num_workers = len(self.devices)
+            if self.min_workers is not None:
+                num_workers = max(num_workers, self.min_workers)
+            if self.max_workers is not None:
+                num_workers = min(num_workers, self.max_workers)
+            if pool is None:
+                indexes = [self._add_worker() for _ in range(num_workers)]
+            else:
+                # adopted workers are running, the number of them is adjusted after starting
+                indexes = []
             self.consumer = self._Consumer(
                 self._get_from_producer,
                 self.consumer_input_queue,
@@ -263,192 +1390,485 @@ class BaseRunner:
                 self.cfg,
                 self.consumer_init,
                 self.consumer_work,
-                self.consumer_end)
-
-            # start workers
-            for producer in self.producers:
-                producer.start()
+                self.consumer_end,
+                release_func = self._release_from_consumer,
+                merge_func = self.consumer_merge if self._combine else None,
+                metrics = self._metrics,
+                trace_events = self._trace_events,
+                profile = bool(self.profile),
+                cpus = self._consumer_cpus(num_workers))
+
+            # start workers after all queues are created, so that producers can steal from each other
+            for index in indexes:
+                self.producers[index].start()
             self.consumer.start()
 
+            if pool is not None and self.num_workers != num_workers:
+                self._resize(num_workers)
 
-    def _put_into_producer(self, data):
-        self.producer_input_queue.put(data)
-    
-    def _get_from_producer(self):
-        return self.producer_output_queue.get()
+            self._watch_stop = threading.Event()
+            self._watcher = threading.Thread(target=self._watch_workers, daemon=True)
+            self._watcher.start()
 
-    def _put_into_consumer(self, data):
-        self.consumer_input_queue.put(data)
-    
-    def _get_from_consumer(self):
-        data = self.consumer_output_queue.get()
-        self.consumer_output_queue.task_done()
-        return data
+            self._autoscale_stop = threading.Event()
+            if self.max_workers is not None:
+                self._autoscaler = threading.Thread(target=self._autoscale, daemon=True)
+                self._autoscaler.start()
+            else:
+                self._autoscaler = None
+
+    def _worker_cpus(self, index):
+        """
+        Returns:
+            set[int] or None: cpus the worker at `index` is pinned to, None if it is not pinned.
+        """
+        if self.affinity is None:
+            return None
+        return worker_cpus(self.affinity, index, self._numa_nodes)
 
+    def _consumer_cpus(self, num_workers):
+        """
+        Returns:
+            set[int] or None: available cpus other than those of the producers (up to `max_workers`
+                of them), None if producers are not pinned or use all cpus.
+        """
+        if self.affinity is None:
+            return None
+        cpus = set(available_cpus())
+        for index in range(max(num_workers, self.max_workers or 0)):
+            cpus -= self._worker_cpus(index)
+        return cpus or None
+
+    def _pool_key(self):
+        """
+        Returns:
+            tuple: key of the producers of this runner in the pools of parked producers, producers
+                are only shared by runners which would start the same producers.
+        """
+        try:
+            cfg_key = hashlib.sha1(pickle.dumps(self.cfg)).hexdigest()
+        except Exception:
+            cfg_key = repr(self.cfg)
+        return (type(self), tuple(str(device) for device in self.devices), cfg_key, self.backend,
+                self.start_method, self.scheduler, self.queue_scale, self.shared_memory,
+                self.combine_interval, self.max_inflight_bytes is not None, bool(self.metrics), self.max_restarts > 0,
+                self.max_batch_size, self.max_wait_ms, repr(self.affinity), repr(self.serializer),
+                self._cache.namespace if self._cache is not None else None)
+
+    def _can_park(self):
+        """
+        Whether the producers can be parked by `close`. Must be called with `_resize_lock` held.
+        """
+        if self.trace or self.profile or self._error is not None or self._pending_chunks:
+            return False
+        # stop tokens of the shared queue must be taken before parking
+        deadline = time.time() + self._PARK_TIMEOUT
+        self._reap_workers()
+        while self._pending_stops and time.time() < deadline:
+            time.sleep(0.01)
+            self._reap_workers()
+        if self._pending_stops:
+            return False
+        return all(self.producers[index].is_alive() for index in self._active_workers)
 
+    @staticmethod
+    def clear_warm_pools():
+        """
+        Stop all producers parked by `close(keep_warm=True)`.
+        """
+        with _warm_pools_lock:
+            pools = [pool for pools in _warm_pools.values() for pool in pools]
+            _warm_pools.clear()
+        for pool in pools:
+            pool.stop()
 
-class UnorderedRunner(BaseRunner):
-    """
-    A Multi-process runner whose consumer receive data in unorder. 
-    The runner will start multi-processes for producers and 1 thread for consumer.
-    """
-    class _Producer(BaseRunner._Producer):
-        def run(self):
-            # initialization
-            self.init_func(self.device, self.cfg)
+    @property
+    def num_workers(self):
+        """ number of running producers, not counting producers being stopped. """
+        return len(self._active_workers) - self._pending_stops
 
-            while True:
-                data = self.input_queue.get()
-                if isinstance(data, self._StopToken):
-                    break
+    def resize(self, num_workers:int):
+        """
+        Start or stop producers until `num_workers` producers are running. Stopped producers
+        finish the chunks already dispatched to them before calling `producer_end`.
 
-                # decode data and do task
-                data = self.work_func(self.device, self.cfg, data)
+        Args:
+            num_workers (int): number of producers, within `min_workers` and `max_workers` if they
+                are set.
+        """
+        if not self.is_activate:
+            raise Exception("The runner is closed. Please activate it.")
+        if not (isinstance(num_workers, int) and num_workers >= 1):
+            raise Exception("parameter `num_workers` must be a positive int.")
+        if (self.min_workers is not None and num_workers < self.min_workers) or \
+                (self.max_workers is not None and num_workers > self.max_workers):
+            raise Exception("parameter `num_workers` must be within `min_workers` and `max_workers`.")
+
+        self._resize(num_workers)
+
+    def _resize(self, num_workers):
+        with self._resize_lock:
+            self._reap_workers()
+            while self.num_workers < num_workers:
+                self.producers[self._add_worker()].start()
+            while self.num_workers > num_workers:
+                self._remove_worker()
+
+    def _add_worker(self):
+        """
+        Create a worker at the first index whose worker has exited, or at a new index.
+        The worker is not started.
 
-                self.output_queue.put(data)
+        Returns:
+            int: index of the worker.
+        """
+        for index, producer in enumerate(self.producers):
+            if not self._worker_active[index] and not producer.is_alive():
+                producer.join()
+                break
+        else:
+            index = len(self.producers)
+            self.producers.append(None)
+            self._worker_active.append(False)
+            if self.scheduler == "shared":
+                self.producer_input_queues.append(self.producer_input_queue)
+            elif self.scheduler == "throughput":
+                # bounded by the in-flight limit of each producer
+                self.producer_input_queues.append(self._queue_class())
+            elif self.queue_scale is None:
+                self.producer_input_queues.append(self._queue_class())
+            else:
+                self.producer_input_queues.append(self._queue_class(maxsize = max(1, math.ceil(self.queue_scale))))
+            self._shm_release_queues.append(self._mp.Queue() if self.shared_memory else None)
+            self._shm_prefixes.append(None)
+            self._worker_slots.append(None)
+            with self._load_condition:
+                self._queue_loads.append(0)
+                self._queue_items.append(0)
+                self._worker_item_times.append(None)
+
+        self._spawn_worker(index)
+        self._worker_active[index] = True
+        with self._load_condition:
+            self._worker_item_times[index] = None
+            self._active_workers.append(index)
+            self._active_workers.sort()
+            self._load_condition.notify_all()
+        return index
+
+    def _spawn_worker(self, index):
+        """
+        Create the worker at `index` with a new slot. The worker is not started.
+        """
+        self._worker_slots[index] = self._new_slot()
+        if self.shared_memory:
+            # short enough for the limit of 31 characters of macOS
+            self._shm_prefixes[index] = "ec{}_".format(secrets.token_hex(6))
+        producer = self._Producer(
+            self.producer_input_queues[index],
+            self.producer_output_queue,
+            self.devices[index % len(self.devices)],
+            self.cfg,
+            self.producer_init,
+            self.producer_work,
+            self.producer_end,
+            index = index,
+            combine_func = self.producer_combine if self._combine else None,
+            combine_interval = self.combine_interval,
+            metrics = self._metrics is not None,
+            report_queue = self._report_queue,
+            trace = self.trace,
+            trace_pid = os.getpid(),
+            profile = bool(self.profile),
+            cpus = self._worker_cpus(index),
+            cache = self._cache)
+        producer._setup_scheduling(self._steal_queues)
+        producer._setup_recovery(self._worker_slots[index])
+        producer._setup_batching(self.max_batch_size, self.max_wait_ms / 1000.0, self._dispatch_blocked)
+        producer._setup_transport(self._serializer, self.backend == "process", self.max_inflight_bytes is not None,
+                                  self._shm_release_queues[index], self._shm_prefixes[index])
+        self.producers[index] = self._create_worker(producer)
+        if self._metrics is not None:
+            self._metrics.start_worker(index, self.devices[index % len(self.devices)])
+
+    def _remove_worker(self):
+        """
+        Stop the active worker with the largest index. With a queue for each producer, chunks are
+        no longer dispatched to it before its stop token is sent.
+        """
+        if self.scheduler == "shared":
+            # any producer may take the token, the exited one is found by `_reap_workers`
+            self._pending_stops += 1
+            self.producer_input_queue.put(self._Producer._StopToken())
+            return
+
+        with self._load_condition:
+            index = self._active_workers.pop()
+        self._worker_active[index] = False
+        self.producer_input_queues[index].put(self._Producer._StopToken())
+
+    def _reap_workers(self):
+        """
+        Mark the workers of the shared queue which have taken a stop token as inactive.
+        """
+        if self.scheduler != "shared" or self._pending_stops == 0:
+            return
+        for index in list(self._active_workers):
+            if self._pending_stops > 0 and self._worker_slots[index][0] == 1 and not self.producers[index].is_alive():
+                self._worker_active[index] = False
+                with self._load_condition:
+                    self._active_workers.remove(index)
+                self._pending_stops -= 1
+
+    def _iter_chunks(self, data_iter):
+        """
+        Split data into chunks for producers.
 
-            # end
-            self.end_func(self.device, self.cfg)
+        Args:
+            data_iter (Iterable): iterator of data
 
+        Yields:
+            list: a chunk of data
+        """
+        if self.chunksize == 1:
+            for data in data_iter:
+                yield [data]
+            return
+
+        remaining = len(data_iter) if hasattr(data_iter, "__len__") else None
+        chunk = []
+        chunksize = self._get_chunksize(remaining)
+        for data in data_iter:
+            chunk.append(data)
+            if len(chunk) >= chunksize:
+                yield chunk
+                if remaining is not None:
+                    remaining -= len(chunk)
+                chunk = []
+                chunksize = self._get_chunksize(remaining)
+        if len(chunk):
+            yield chunk
+
+    def _prefetch_chunks(self, data_iter):
+        """
+        Split data into chunks like `_iter_chunks`, in a feeder thread reading up to `prefetch`
+        chunks ahead if `prefetch` is set. Exceptions raised by `data_iter` are raised here.
 
-    class _Consumer(BaseRunner._Consumer):
-        def run(self):
+        Args:
+            data_iter (Iterable): iterator of data
+
+        Yields:
+            list: a chunk of data
+        """
+        if not self.prefetch:
+            yield from self._iter_chunks(data_iter)
+            return
+
+        chunks = queue.Queue(maxsize = self.prefetch)
+        stop = threading.Event()
+        feeder = threading.Thread(target=self._feed, args=(data_iter, chunks, stop), daemon=True)
+        feeder.start()
+        try:
             while True:
-                data = self.input_queue.get()
-                self.input_queue.task_done()
-                if isinstance(data, self._StopToken):
+                chunk = chunks.get()
+                if isinstance(chunk, self._Producer._StopToken):
                     break
-                elif isinstance(data, self._InitToken):
-                    # initialization
-                    cfg = self.cfg.copy()
-                    self.init_func(cfg)
-                elif isinstance(data, self._EndToken):
-                    # end
-                    data = self.end_func(cfg)
-                    self.output_queue.put(data)
-                    del cfg
-                else:
-                    # work
-                    data = self.receive_func()
-                    self.work_func(cfg, data)
-
+                elif isinstance(chunk, self._Consumer._ErrorToken):
+                    raise chunk.error
+                yield chunk
+        finally:
+            # stop the feeder if the iteration is abandoned, `data_iter` is not shared with it after
+            stop.set()
+            feeder.join()
+
+    def _feed(self, data_iter, chunks, stop):
+        """
+        Thread putting chunks of `data_iter` into `chunks` until `data_iter` is exhausted or
+        `stop` is set.
+        """
+        def put(item):
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=self._FEED_INTERVAL)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        try:
+            for chunk in self._iter_chunks(data_iter):
+                if not put(chunk):
+                    return
+        except Exception as e:
+            put(self._Consumer._ErrorToken(e))
+        else:
+            put(self._Producer._StopToken())
 
-    def __init__(self,
-                 devices,
-                 cfg = CN(),
-                 queue_scale = 3.0):
+    def _create_worker(self, producer):
         """
         Args:
-            devices (int or Iterable): If the `devices` is `int`, it will use devices cpu to do
-                the work. If the `devices` is an iterable object, such as list, it will use the
-                devices specified by the iterable object, such as ["cpu", "cuda:0", "cuda:1"].
-            cfg (easycore.common.config.CfgNode): user custom data.
-            queue_scale (float): scale the queues for communication between processes.
+            producer (BaseRunner._Producer):
+
+        Returns:
+            multiprocessing.Process or threading.Thread: worker running the producer.
         """
-        super(UnorderedRunner, self).__init__(devices, cfg=cfg, queue_scale=queue_scale)
+        if self.backend == "process":
+            return self._mp.Process(target=producer.run)
+        return threading.Thread(target=producer.run, daemon=True)
+
+    def _reset_ids(self):
+        # ids are never reused, so that chunks held by a dead producer are not confused with chunks
+        # of a later call
+        with self._reorder_condition:
+            self._get_id = self._put_id
+
+    def _send_chunk(self, chunk, block = False):
+        start = time.time()
+        if block:
+            self._wait_inflight()
+        id = self._put_id
+        self._put_id += 1
+        self._dispatched += 1
+        self._charge_chunk(id, chunk)
+        input_queue = self.producer_input_queues[self._select_queue(id, len(chunk), block)]
+        if self._metrics is None and self._trace_events is None:
+            input_queue.put((id, self._encode_chunk(chunk)))
+        else:
+            # producers measure the time spent in the queue
+            input_queue.put((id, self._encode_chunk(chunk), time.time()))
+        if self._metrics is not None:
+            self._metrics.add("dispatch", time.time() - start, len(chunk))
 
+    def _receive_chunk(self):
+        """
+        Returns:
+            tuple: id, chunk of processed data (or [partial aggregate], or an `_ErrorToken` if
+                `producer_work` raised on the chunk) and number of data covered.
+        """
+        while True:
+            data = self.producer_output_queue.get()
+            if isinstance(data, self._Consumer._RecoverToken):
+                self._receive_recover_token(data)
+                continue
+            if isinstance(data, self._Consumer._ErrorToken):
+                # leave it to other receivers
+                self.producer_output_queue.put(data)
+                raise data.error
+            break
+        id, chunk, elapsed, index, count, nbytes, timing = data
+        self._finish_chunk(id, count, elapsed, index, nbytes)
+        if not isinstance(chunk, self._Consumer._ErrorToken):
+            chunk = self._deserialize(chunk, elapsed, count, timing)
+        if self._trace_events is not None:
+            self._trace_received(id)
+        return id, chunk, count
+
+    def _trace_received(self, id):
+        now = time.time()
+        for i in (id if isinstance(id, list) else [id]):
+            self._trace_events.append(_trace_async_event("output_queue", "e", now, os.getpid(), i))
+
+    def _collect_reports(self):
+        """
+        Thread collecting trace events and profiles sent by producers until the runner is closed.
+        """
+        while True:
+            report = self._report_queue.get()
+            if isinstance(report, self._Producer._StopToken):
+                break
+            if report[0] == "trace":
+                self._trace_events.extend(report[1])
+            else:
+                self._add_profile(report[1], report[2])
+
+    def _add_profile(self, worker, raw_stats):
+        """
+        Merge raw stats of a profiler into the profile of `worker`, a restarted producer adds to
+        the profile of the one it replaces.
+        """
+        if worker in self._profiles:
+            self._profiles[worker].add(load_profile(raw_stats))
+        else:
+            self._profiles[worker] = load_profile(raw_stats)
+
+    def _put_into_producer(self, chunk):
+        if self.max_reorder is not None:
+            with self._reorder_condition:
+                if self._put_id - self._get_id >= self.max_reorder:
+                    self._dispatch_blocked.value = 1
+                    try:
+                        while self._put_id - self._get_id >= self.max_reorder:
+                            self._check_error()
+                            self._reorder_condition.wait()
+                    finally:
+                        self._dispatch_blocked.value = 0
+        # results are received by the consumer thread, it is safe to wait for a producer
+        self._send_chunk(chunk, block=True)
+    
+    def _get_from_producer(self):
+        id, chunk, count = self._receive_chunk()
+        return self._decode_chunk(chunk), count
 
+    def _get_chunk_in_order(self, copy = False):
+        while self._get_id not in self._reorder_buffer:
+            id, chunk, count = self._receive_chunk()
+            self._reorder_buffer[id] = chunk
 
-class OrderedRunner(BaseRunner):
-    """ 
-    A Multi-process runner whose consumer receive data in order. 
-    The runner will start multi-processes for producers and 1 thread for consumer.
-    """
-    class _Producer(BaseRunner._Producer):
-        def run(self):
-            # initialization
-            self.init_func(self.device, self.cfg)
+        chunk = self._reorder_buffer.pop(self._get_id)
+        with self._reorder_condition:
+            self._get_id += 1
+            self._reorder_condition.notify()
+        return self._decode_chunk(chunk, copy)
 
-            while True:
-                data = self.input_queue.get()
-                if isinstance(data, self._StopToken):
-                    break
+    def _put_into_consumer(self, data):
+        self.consumer_input_queue.put(data)
+    
+    def _get_from_consumer(self):
+        data = self.consumer_output_queue.get()
+        self.consumer_output_queue.task_done()
+        if isinstance(data, self._Consumer._ErrorToken):
+            raise data.error
+        return data
 
-                # decode data and do task
-                id, data = data
-                data = self.work_func(self.device, self.cfg, data)
 
-                self.output_queue.put((id, data))
+# registered before any runner, so that it runs after runners are closed at exit
+atexit.register(BaseRunner.clear_warm_pools)
 
-            # end
-            self.end_func(self.device, self.cfg)
 
+class UnorderedRunner(BaseRunner):
+    """
+    A Multi-process runner whose consumer receive data in unorder. 
+    The runner will start multi-processes for producers and 1 thread for consumer.
+    Arguments are those of `BaseRunner`.
+    """
 
-    class _Consumer(BaseRunner._Consumer):
-        def run(self):
-            while True:
-                data = self.input_queue.get()
-                self.input_queue.task_done()
-                if isinstance(data, self._StopToken):
-                    break
-                elif isinstance(data, self._InitToken):
-                    # initialization
-                    cfg = self.cfg.copy()
-                    self.init_func(cfg)
-                elif isinstance(data, self._EndToken):
-                    # end
-                    data = self.end_func(cfg)
-                    self.output_queue.put(data)
-                    del cfg
-                else:
-                    data = self.receive_func()
-                    self.work_func(cfg, data)
 
-    def __init__(self,
-                 devices,
-                 cfg = CN(),
-                 queue_scale = 3.0):
+class OrderedRunner(BaseRunner):
+    """ 
+    A Multi-process runner whose consumer receive data in order. 
+    The runner will start multi-processes for producers and 1 thread for consumer.
+    """
+    def __init__(self, *args, max_reorder = None, **kwargs):
         """
         Args:
-            devices (int or Iterable): If the `devices` is `int`, it will use devices cpu to do
-                the work. If the `devices` is an iterable object, such as list, it will use the
-                devices specified by the iterable object, such as ["cpu", "cuda:0", "cuda:1"].
-            cfg (easycore.common.config.CfgNode): user custom data.
-            queue_scale (float): scale the queues for communication between processes.
-        """
-        super(OrderedRunner, self).__init__(devices, cfg=cfg, queue_scale=queue_scale)
-
+            max_reorder (int or None): maximum number of chunks dispatched ahead of the oldest chunk
+                not yet received by the consumer. Dispatching blocks when the window is full, so
+                results waiting for a slow chunk are bounded in memory. None means unlimited.
 
-    def close(self):
-        """
-        Shutdown all processes if this runner is alive.
+            Other arguments are those of `BaseRunner`.
         """
-        if self.is_activate:
-            del self._put_id, self._get_id
-            del self._id_buffer, self._data_buffer
+        self._is_activate = False
+        if self.producer_combine is not BaseRunner.producer_combine:
+            raise Exception("OrderedRunner does not support `producer_combine`, use UnorderedRunner.")
+        if max_reorder is not None and not (isinstance(max_reorder, int) and max_reorder >= 1):
+            raise Exception("parameter `max_reorder` must be a positive int or None.")
+        self.max_reorder = max_reorder
 
-            super(OrderedRunner, self).close()
+        super(OrderedRunner, self).__init__(*args, **kwargs)
 
-    def activate(self):
-        """
-        Restart all processes if this runner is closed.
-        """
-        if not self.is_activate:
-            self._put_id = 0
-            self._get_id = 0
-            self._id_buffer = []
-            self._data_buffer = []
-
-            super(OrderedRunner, self).activate()
 
-    def _put_into_producer(self, data):
-        id = self._put_id
-        self._put_id += 1
-        self.producer_input_queue.put((id, data))
-    
     def _get_from_producer(self):
-        if len(self._id_buffer) and self._id_buffer[0] == self._get_id:
-            data = self._data_buffer[0]
-            del self._id_buffer[0], self._data_buffer[0]
-            self._get_id += 1
-            return data
-
-        while True:
-            id, data = self.producer_output_queue.get()
-            if id == self._get_id:
-                self._get_id += 1
-                return data
-            insert_position = bisect.bisect(self._id_buffer, id)
-            self._id_buffer.insert(insert_position, id)
-            self._data_buffer.insert(insert_position, data)
-
+        chunk = self._get_chunk_in_order()
+        if isinstance(chunk, self._Consumer._ErrorToken):
+            return chunk, chunk.count
+        return chunk, len(chunk)
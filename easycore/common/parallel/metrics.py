@@ -0,0 +1,244 @@
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+
+__all__ = ["RunnerMetrics", "format_prometheus", "export_stats", "start_profiler", "stop_profiler", "load_profile"]
+
+
+def _trace_event(name, start, end, tid, args = None):
+    """
+    Returns:
+        dict: a complete event of the Chrome trace event format, times are in seconds since epoch.
+    """
+    event = {"name": name, "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6,
+             "pid": os.getpid(), "tid": tid}
+    if args is not None:
+        event["args"] = args
+    return event
+
+
+def _trace_async_event(name, phase, time, pid, id):
+    """
+    Returns:
+        dict: a begin ("b") or end ("e") event of the Chrome trace event format. Async events may
+            overlap, they are matched by `name` and `id`.
+    """
+    return {"name": name, "cat": "queue", "ph": phase, "ts": time * 1e6, "pid": pid, "tid": 0, "id": id}
+
+
+def _trace_thread_name(tid, name):
+    return {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+
+
+class RunnerMetrics:
+    """
+    Timings of the stages of a runner, aggregated over chunks.
+
+    Stages:
+        dispatch: time spent by the caller to put a chunk into the producer input queues,
+            including waiting for room in the queues.
+        queue_wait: time between dispatching a chunk and a producer taking it.
+        work: time spent in `producer_work` (and `producer_combine`).
+        serialize: time spent pickling results in producers.
+        transit: time between a producer sending results and the runner receiving them.
+        deserialize: time spent unpickling results in the runner.
+        consume: time spent in `consumer_work` (or `consumer_merge`).
+    """
+
+    STAGES = ("dispatch", "queue_wait", "work", "serialize", "transit", "deserialize", "consume")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._workers = {}
+        self.reset()
+
+    def reset(self):
+        """
+        Clear all timings. Workers are kept but their counters are cleared.
+        """
+        with self._lock:
+            self._start = time.time()
+            # stage -> [chunks, data, total seconds, max seconds of a chunk]
+            self._stages = {stage: [0, 0, 0.0, 0.0] for stage in self.STAGES}
+            for worker in self._workers.values():
+                worker["start"] = self._start
+                worker["chunks"] = 0
+                worker["data"] = 0
+                worker["busy"] = 0.0
+
+    def add(self, stage:str, seconds:float, count:int = 1):
+        """
+        Args:
+            stage (str): one of `STAGES`.
+            seconds (float): time spent on a chunk in the stage.
+            count (int): number of data in the chunk.
+        """
+        with self._lock:
+            record = self._stages[stage]
+            record[0] += 1
+            record[1] += count
+            record[2] += seconds
+            if seconds > record[3]:
+                record[3] = seconds
+
+    def start_worker(self, index:int, device:str):
+        """
+        Start the utilization clock of a worker, a restarted worker keeps its counters.
+        """
+        with self._lock:
+            if index not in self._workers:
+                self._workers[index] = {"device": device, "start": time.time(), "chunks": 0, "data": 0, "busy": 0.0}
+
+    def add_work(self, index:int, seconds:float, count:int):
+        """
+        Record `seconds` spent in `producer_work` by the worker `index` on `count` data.
+        """
+        with self._lock:
+            worker = self._workers.get(index)
+            if worker is not None:
+                worker["chunks"] += 1
+                worker["data"] += count
+                worker["busy"] += seconds
+
+    def stats(self):
+        """
+        Returns:
+            dict: with keys "elapsed" (seconds since the last reset), "stages" (for each stage: chunks,
+                data, total, mean seconds per data and max seconds of a chunk) and "workers" (for each
+                worker index: device, chunks, data, busy seconds and utilization).
+        """
+        with self._lock:
+            now = time.time()
+            stages = {}
+            for stage, (chunks, data, total, maximum) in self._stages.items():
+                stages[stage] = {
+                    "chunks": chunks,
+                    "data": data,
+                    "total": total,
+                    "mean": total / data if data else 0.0,
+                    "max": maximum,
+                }
+            workers = {}
+            for index, worker in self._workers.items():
+                wall = max(now - worker["start"], 1e-9)
+                workers[index] = {
+                    "device": worker["device"],
+                    "chunks": worker["chunks"],
+                    "data": worker["data"],
+                    "busy": worker["busy"],
+                    "utilization": min(1.0, worker["busy"] / wall),
+                }
+            return {"elapsed": now - self._start, "stages": stages, "workers": workers}
+
+
+def format_prometheus(stats:dict, prefix:str = "easycore_runner"):
+    """
+    Format the stats of a runner in the Prometheus text exposition format.
+
+    Args:
+        stats (dict): output of :meth:`RunnerMetrics.stats`.
+        prefix (str): prefix of the metric names.
+
+    Returns:
+        str:
+    """
+    lines = []
+
+    def metric(name, kind, help, samples):
+        lines.append("# HELP {}_{} {}".format(prefix, name, help))
+        lines.append("# TYPE {}_{} {}".format(prefix, name, kind))
+        for labels, value in samples:
+            label_str = ",".join('{}="{}"'.format(key, value) for key, value in labels)
+            lines.append("{}_{}{{{}}} {}".format(prefix, name, label_str, repr(float(value))))
+
+    stages = stats["stages"].items()
+    metric("stage_seconds_total", "counter", "Total seconds spent in each stage.",
+           [((("stage", stage),), record["total"]) for stage, record in stages])
+    metric("stage_data_total", "counter", "Number of data through each stage.",
+           [((("stage", stage),), record["data"]) for stage, record in stages])
+    metric("stage_chunk_seconds_max", "gauge", "Maximum seconds spent on a chunk in each stage.",
+           [((("stage", stage),), record["max"]) for stage, record in stages])
+
+    workers = stats["workers"].items()
+    metric("worker_busy_seconds_total", "counter", "Seconds spent in producer_work by each worker.",
+           [((("worker", index), ("device", worker["device"])), worker["busy"]) for index, worker in workers])
+    metric("worker_data_total", "counter", "Number of data processed by each worker.",
+           [((("worker", index), ("device", worker["device"])), worker["data"]) for index, worker in workers])
+    metric("worker_utilization", "gauge", "Fraction of time each worker spent in producer_work.",
+           [((("worker", index), ("device", worker["device"])), worker["utilization"]) for index, worker in workers])
+    return "\n".join(lines) + "\n"
+
+
+def export_stats(stats:dict, path:str, format:str = None):
+    """
+    Write the stats of a runner to a file.
+
+    Args:
+        stats (dict): output of :meth:`RunnerMetrics.stats`.
+        path (str): path of the file.
+        format (str or None): "prometheus" or "json". None means "json" for paths ending with
+            ".json" and "prometheus" otherwise.
+    """
+    if format is None:
+        format = "json" if path.endswith(".json") else "prometheus"
+    if format == "json":
+        content = json.dumps(stats, indent=2, sort_keys=True)
+    elif format == "prometheus":
+        content = format_prometheus(stats)
+    else:
+        raise Exception("parameter `format` must be \"prometheus\" or \"json\".")
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def start_profiler():
+    """
+    Returns:
+        cProfile.Profile or None: an enabled profiler, or None if another profiler is already
+            active, which Python >= 3.12 does not allow.
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+def stop_profiler(profiler):
+    """
+    Returns:
+        dict: raw stats of `profiler`, which can be pickled to another process and loaded by
+            `load_profile`.
+    """
+    profiler.disable()
+    profiler.create_stats()
+    return profiler.stats
+
+
+class _RawProfile:
+    """
+    Raw stats in the form `pstats.Stats` loads from a profiler.
+    """
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def load_profile(*raw_stats):
+    """
+    Args:
+        raw_stats (dict): outputs of `stop_profiler`.
+
+    Returns:
+        pstats.Stats: all `raw_stats` merged.
+    """
+    stats = pstats.Stats()
+    for raw in raw_stats:
+        stats.add(_RawProfile(raw))
+    return stats
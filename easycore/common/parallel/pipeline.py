@@ -0,0 +1,174 @@
+import queue
+import threading
+
+__all__ = ["Pipeline"]
+
+
+class Pipeline:
+    """
+    A chain of runners, such as decode -> model -> postprocess, each stage with its own producers
+    and devices. Results of `producer_work` of a stage are relayed to the next stage by this process
+    as soon as they are received, so all stages work at the same time on different data.
+
+    Results do not go from the producers of a stage to those of the next one: this process receives
+    them from a stage, deserializing them, and dispatches them to the next stage, serializing them
+    again. Each stage but the last is iterated by a thread which puts its results into a bounded
+    buffer read by the next stage. A stage only receives new data when the next stage takes its results,
+    so a slow stage holds back the stages before it instead of letting results pile up in memory.
+    Stages are iterated with `imap`, which copies arrays of a stage with `shared_memory=True` out
+    of its segments, so buffered results stay valid while the stage reuses the segments.
+    """
+
+    class _StopToken:
+        pass
+
+    class _ErrorToken:
+        def __init__(self, error):
+            self.error = error
+
+    # seconds between two checks of a stage thread for an abandoned iteration.
+    _PUMP_INTERVAL = 0.1
+
+    def __init__(self, stages, ordered = True, max_inflight = None, buffer_size = 16):
+        """
+        Args:
+            stages (list[BaseRunner]): runners of the stages, in order. A runner must not be shared
+                by two stages or used elsewhere while the pipeline runs. Runners with
+                `producer_combine` can only be the last stage and only with `__call__`.
+            ordered (bool or list[bool]): whether each stage yields its results in the order of its
+                input (`imap`) or as soon as they are completed (`imap_unordered`). The output of
+                the pipeline is in the order of the input only if all stages are ordered.
+            max_inflight (int or None or list): maximum number of chunks dispatched by each stage
+                but not yielded yet, see `BaseRunner.imap`.
+            buffer_size (int or list[int]): number of results of each stage but the last buffered
+                for the next stage.
+        """
+        self.stages = list(stages)
+        if len(self.stages) == 0:
+            raise Exception("parameter `stages` must contain at least one runner.")
+        if len(set(id(stage) for stage in self.stages)) != len(self.stages):
+            raise Exception("a runner must not be used by two stages.")
+
+        self.ordered = self._per_stage("ordered", ordered, len(self.stages))
+        self.max_inflight = self._per_stage("max_inflight", max_inflight, len(self.stages))
+        self.buffer_size = self._per_stage("buffer_size", buffer_size, len(self.stages) - 1)
+        for size in self.buffer_size:
+            if not (isinstance(size, int) and size >= 1):
+                raise Exception("parameter `buffer_size` must be a positive int.")
+
+    @staticmethod
+    def _per_stage(name, value, count):
+        """
+        Returns:
+            list: `value` for each of `count` stages.
+        """
+        if isinstance(value, (list, tuple)):
+            if len(value) != count:
+                raise Exception("parameter `{}` must have {} values.".format(name, count))
+            return list(value)
+        return [value] * count
+
+    def __call__(self, data_iter):
+        """
+        Relay `data_iter` through the stages, the last stage receives results of the previous
+        stage like a runner called directly, with its consumer functions.
+
+        Args:
+            data_iter (Iterable): iterator of data
+
+        Returns:
+            Any: result of the last stage.
+        """
+        data_iter = self._chain(data_iter, len(self.stages) - 1)
+        try:
+            return self.stages[-1](data_iter)
+        finally:
+            data_iter.close()
+
+    def imap(self, data_iter):
+        """
+        Lazily iterate results of `producer_work` of the last stage.
+        The consumer functions are not called.
+
+        Args:
+            data_iter (Iterable): iterator of data
+
+        Yields:
+            Any: processed data of the last stage.
+        """
+        return self._chain(data_iter, len(self.stages))
+
+    def _chain(self, data_iter, count):
+        """
+        Chain the first `count` stages on `data_iter`, the results of each stage but the last of
+        them are read by a thread.
+
+        Yields:
+            Any: processed data of the last chained stage.
+        """
+        for index in range(count):
+            if index > 0:
+                data_iter = self._buffered(data_iter, self.buffer_size[index - 1])
+            stage = self.stages[index]
+            if self.ordered[index]:
+                data_iter = stage.imap(data_iter, max_inflight=self.max_inflight[index])
+            else:
+                data_iter = stage.imap_unordered(data_iter, max_inflight=self.max_inflight[index])
+        yield from data_iter
+
+    def _buffered(self, results, buffer_size):
+        """
+        Iterate `results` in a thread up to `buffer_size` results ahead. Exceptions raised by
+        `results` are raised here. `results` is closed by the thread when the iteration ends or is
+        abandoned.
+
+        Yields:
+            Any: data of `results`.
+        """
+        buffer = queue.Queue(maxsize = buffer_size)
+        stop = threading.Event()
+        pump = threading.Thread(target=self._pump, args=(results, buffer, stop), daemon=True)
+        pump.start()
+        try:
+            while True:
+                data = buffer.get()
+                if isinstance(data, self._StopToken):
+                    break
+                elif isinstance(data, self._ErrorToken):
+                    raise data.error
+                yield data
+        finally:
+            stop.set()
+            pump.join()
+
+    def _pump(self, results, buffer, stop):
+        """
+        Thread putting data of `results` into `buffer` until `results` is exhausted or `stop` is set.
+        """
+        def put(item):
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=self._PUMP_INTERVAL)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        try:
+            for data in results:
+                if not put(data):
+                    return
+        except Exception as e:
+            put(self._ErrorToken(e))
+        else:
+            put(self._StopToken())
+        finally:
+            # drains the stage and the stages before it in this thread, where they are iterated
+            results.close()
+
+    def close(self):
+        """
+        Shutdown the runners of all stages.
+        """
+        for stage in self.stages:
+            stage.close()
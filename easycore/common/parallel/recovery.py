@@ -0,0 +1,297 @@
+import select
+import threading
+
+
+# number of the last chunks taken by each producer which are remembered to dispatch them again if
+# the producer dies. It bounds the chunks whose results are not received yet, so producers combine
+# at most half of it before sending a partial aggregate.
+_MAX_HELD_CHUNKS = 4096
+
+# positions in the slot of each producer of the locks it holds, see `_ProducerRecovery._track_locks`,
+# and of the first chunk it has taken, see `_ProducerRecovery._hold`.
+_SLOT_READ = 2
+_SLOT_OUTPUT = 3
+_SLOT_REPORT = 4
+_SLOT_HEADER = 5
+
+
+class _TrackedLock:
+    """
+    Lock of a `multiprocessing.Queue` recording in `slot[position]` whether this process holds it:
+    `value` while it is held, and a negative number while the pipe of the queue is read or written
+    under it, see `_track_reads` and `_track_writes`. The runner releases the locks held by a dead
+    producer. The lock and the record can not change at once: a process killed between them, a few
+    instructions, leaves the lock held without a record, never a record without the lock.
+    """
+
+    def __init__(self, lock, slot, position, value):
+        self._acquire = lock.acquire
+        self._release = lock.release
+        self.slot = slot
+        self.position = position
+        self.value = value
+
+    def acquire(self, *args, **kwargs):
+        if not self._acquire(*args, **kwargs):
+            return False
+        self.slot[self.position] = self.value
+        return True
+
+    def release(self):
+        # cleared first, a lock recorded as held is always held
+        self.slot[self.position] = 0
+        self._release()
+
+    def __enter__(self):
+        self._acquire()
+        self.slot[self.position] = self.value
+        return True
+
+    def __exit__(self, *args):
+        self.slot[self.position] = 0
+        self._release()
+
+
+def _track_reads(q, slot, position, value):
+    """
+    Record the read lock of the `multiprocessing.Queue` `q` in `slot[position]`. A read waits for a
+    message before it is recorded, so that a process killed while it waits on an empty queue only
+    holds the lock. Must be called before `q` is read.
+    """
+    q._rlock = _TrackedLock(q._rlock, slot, position, value)
+    recv_bytes = q._recv_bytes
+    # created once, `Connection.poll` creates a selector at each call
+    poller = select.poll() if hasattr(select, "poll") else None
+    if poller is not None:
+        poller.register(q._reader.fileno(), select.POLLIN)
+
+    def tracked_recv_bytes():
+        if poller is not None:
+            poller.poll()
+        slot[position] = -value
+        try:
+            return recv_bytes()
+        finally:
+            slot[position] = value
+
+    q._recv_bytes = tracked_recv_bytes
+
+
+def _track_writes(q, slot, position):
+    """
+    Record the write lock of the `multiprocessing.Queue` `q` in `slot[position]`. Must be called
+    before the feeder thread of `q` is started.
+    """
+    q._wlock = _TrackedLock(q._wlock, slot, position, 1)
+    send_bytes = q._send_bytes
+
+    def tracked_send_bytes(buf):
+        # minus the size of the message with its header, it tells whether it is written at once
+        slot[position] = -(len(buf) + 4)
+        try:
+            return send_bytes(buf)
+        finally:
+            slot[position] = 1
+
+    q._send_bytes = tracked_send_bytes
+
+
+class _ProducerRecovery:
+    """
+    Producer side of recovery: recording in a shared slot the chunks and queue locks held by the
+    producer, so that the runner restarts it if it dies.
+    """
+
+    def _setup_recovery(self, slot = None):
+        """
+        Args:
+            slot (RawArray or None): shared array of the state of this producer, and of the chunks
+                and locks it holds if it may be restarted, see `_hold`.
+        """
+        self.slot = slot
+        self.recoverable = slot is not None and len(slot) > _SLOT_HEADER
+
+    def _track_locks(self):
+        """
+        Record in `slot` the locks of queues held by this producer, so that the runner
+        releases them if this producer dies, see `_RunnerRecovery._release_locks`. Input queues are
+        recorded with their index plus one.
+        """
+        input_queues = {}
+        for index, input_queue in enumerate(self.steal_queues or []):
+            input_queues[id(input_queue)] = (input_queue, index + 1)
+        input_queues.setdefault(id(self.input_queue), (self.input_queue, self.index + 1))
+        for input_queue, value in input_queues.values():
+            # queues of threads have no locks shared with other processes
+            if getattr(input_queue, "_rlock", None) is not None:
+                _track_reads(input_queue, self.slot, _SLOT_READ, value)
+        for position, output_queue in ((_SLOT_OUTPUT, self.output_queue),
+                                       (_SLOT_REPORT, self.report_queue)):
+            if getattr(output_queue, "_wlock", None) is not None:
+                _track_writes(output_queue, self.slot, position)
+
+    def _hold(self, id, index):
+        """
+        Record a chunk taken by this producer in the ring buffer of `slot`, so that it is
+        dispatched again if this producer dies before its result reaches the runner. The layout
+        of `slot` is [state, number of chunks taken, locks held (see `_track_locks`), id, queue
+        index, id, queue index, ...].
+        """
+        if self.recoverable:
+            count = self.slot[1]
+            position = _SLOT_HEADER + 2 * (count % _MAX_HELD_CHUNKS)
+            self.slot[position] = id
+            self.slot[position + 1] = index
+            self.slot[1] = count + 1
+
+    def _mark_stopped(self):
+        """
+        Record that this producer exits normally, so that it is not restarted.
+        """
+        if self.slot is not None:
+            self.slot[0] = 1
+
+
+class _RunnerRecovery:
+    """
+    Runner side of recovery: watching producers, restarting dead ones and dispatching their lost
+    chunks again, or failing the pending call.
+    """
+
+    # seconds between two checks of the liveness of producers.
+    _WATCH_INTERVAL = 0.1
+
+    def _init_recovery(self, max_restarts):
+        """
+        Check and set the arguments of recovery, see `BaseRunner`.
+        """
+        if not (isinstance(max_restarts, int) and max_restarts >= 0):
+            raise Exception("parameter `max_restarts` must be a non-negative int.")
+        self.max_restarts = max_restarts
+
+    def _new_slot(self):
+        """
+        Returns:
+            RawArray: slot of a new producer, see `_ProducerRecovery._hold`. Without restarts, it
+                only holds the state of the producer.
+        """
+        size = _SLOT_HEADER + 2 * _MAX_HELD_CHUNKS if self.max_restarts > 0 else 1
+        return self._mp.RawArray("q", size)
+
+    def _watch_workers(self):
+        """
+        Thread restarting producers which exit unexpectedly.
+        """
+        while not self._watch_stop.wait(self._WATCH_INTERVAL):
+            with self._resize_lock:
+                if self._error is not None:
+                    return
+                for index in list(self._active_workers):
+                    producer = self.producers[index]
+                    # producers exiting normally set their state to 1 before exiting
+                    if not producer.is_alive() and self._worker_slots[index][0] != 1:
+                        self._recover_worker(index)
+                        if self._error is not None:
+                            return
+
+    def _recover_worker(self, index):
+        """
+        Restart the dead worker at `index` and dispatch its chunks again. Must be called with
+        `_resize_lock` held.
+        """
+        producer = self.producers[index]
+        producer.join()
+        exitcode = getattr(producer, "exitcode", None)
+        if self._shm_reader is not None:
+            self._shm_reader.unlink_writer(self._shm_prefixes[index])
+
+        # without restarts, the chunks and locks held by producers are not recorded
+        if self.max_restarts > 0:
+            slot = self._worker_slots[index]
+            held = [(slot[_SLOT_HEADER + 2 * i], slot[_SLOT_HEADER + 1 + 2 * i])
+                    for i in range(min(slot[1], _MAX_HELD_CHUNKS))]
+            broken = self._release_locks(slot)
+            if broken is not None:
+                self._fail(Exception("producer {} on device {} exited unexpectedly (exit code {}) while {}, "
+                                     "the runner must be closed.".format(
+                    index, self.devices[index % len(self.devices)], exitcode, broken)))
+                return
+
+        self._restarts += 1
+        if self._restarts > self.max_restarts:
+            self._fail(Exception("producer {} on device {} exited unexpectedly (exit code {}) after {} restarts.".format(
+                index, self.devices[index % len(self.devices)], exitcode, self.max_restarts)))
+            return
+
+        # the queues of the dead producer are kept, its locks are released
+        self._spawn_worker(index)
+        self.producers[index].start()
+
+        # results sent by the dead producer are all ahead of the token in the output queue, chunks
+        # still pending when the token is received are lost.
+        self.producer_output_queue.put(self._Consumer._RecoverToken(held))
+
+    def _release_locks(self, slot):
+        """
+        Release the locks of queues held by a dead producer, see `_ProducerRecovery._track_locks`.
+
+        Args:
+            slot (RawArray): slot of the dead producer.
+
+        Returns:
+            str or None: what the producer was doing if it died while reading or writing a queue,
+                the pipe of the queue may be left in the middle of a message, which can not be
+                repaired. Its lock is released anyway, so that the failure can be reported.
+        """
+        broken = None
+        value = slot[_SLOT_READ]
+        if value != 0:
+            if value < 0:
+                broken = "reading its input queue"
+            self.producer_input_queues[abs(value) - 1]._rlock.release()
+        for position, output_queue, name in ((_SLOT_OUTPUT, self.producer_output_queue, "output"),
+                                             (_SLOT_REPORT, self._report_queue, "report")):
+            value = slot[position]
+            if value != 0:
+                # a message of at most PIPE_BUF bytes is written at once or not at all
+                if -value > select.PIPE_BUF:
+                    broken = "writing to the {} queue".format(name)
+                output_queue._wlock.release()
+        return broken
+
+    def _redispatch(self, held):
+        """
+        Dispatch again the chunks lost with a dead producer.
+
+        Args:
+            held (list[tuple]): id and queue index of the last chunks taken by the producer.
+        """
+        for id, source in held:
+            chunk = self._pending_chunks.get(id)
+            if chunk is None:
+                # the result has been received
+                continue
+            if self.scheduler != "shared":
+                with self._load_condition:
+                    self._queue_loads[source] -= 1
+                    self._queue_items[source] -= len(chunk)
+            self.producer_input_queues[self._select_queue(id, len(chunk))].put((id, self._encode_chunk(chunk)))
+
+    def _receive_recover_token(self, token):
+        # dispatch in another thread, the receiver must not wait for a full input queue
+        threading.Thread(target=self._redispatch, args=(token.held,), daemon=True).start()
+
+    def _fail(self, error):
+        """
+        Make pending and later calls raise `error`.
+        """
+        self._error = error
+        self.producer_output_queue.put(self._Consumer._ErrorToken(error))
+        with self._load_condition:
+            self._load_condition.notify_all()
+        with self._reorder_condition:
+            self._reorder_condition.notify_all()
+
+    def _check_error(self):
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,398 @@
+import math
+import os
+import queue
+import sys
+
+
+def _qsize(q):
+    """
+    Approximate size of a queue, 0 if it is not supported by the platform (macOS).
+    """
+    try:
+        return q.qsize()
+    except NotImplementedError:
+        return 0
+
+
+def _cpu_utilization():
+    """
+    Returns:
+        float or None: load average of the last minute per cpu, None if unavailable (Windows).
+    """
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def _estimate_nbytes(data):
+    """
+    Cheap estimate of the memory held by a data, counting buffers of arrays, bytes and strings
+    and the items of lists, tuples and dicts.
+    """
+    nbytes = getattr(data, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(data, (bytes, bytearray, str)):
+        return len(data)
+    if isinstance(data, (list, tuple)):
+        return sys.getsizeof(data) + sum(_estimate_nbytes(item) for item in data)
+    if isinstance(data, dict):
+        return sys.getsizeof(data) + sum(_estimate_nbytes(key) + _estimate_nbytes(value)
+                                         for key, value in data.items())
+    return sys.getsizeof(data)
+
+
+class _ProducerScheduling:
+    """
+    Producer side of scheduling: taking chunks from the own queue, or stealing them from the
+    queues of other producers.
+    """
+
+    # seconds an idle producer waits on its own queue before trying to steal again.
+    _STEAL_INTERVAL = 0.005
+
+    def _setup_scheduling(self, steal_queues = None):
+        """
+        Args:
+            steal_queues (list or None): input queues of all producers, to steal chunks from when
+                the own queue is empty. None means this producer does not steal.
+        """
+        self.steal_queues = steal_queues
+
+    def _take_task(self, timeout = None):
+        """
+        Returns:
+            tuple: task and index of the queue it comes from, see `_get_task`.
+        """
+        if self.steal_queues is None:
+            return self.input_queue.get(timeout=timeout), self.index
+
+        while True:
+            try:
+                return self.input_queue.get_nowait(), self.index
+            except queue.Empty:
+                pass
+
+            # steal from other producers when the own queue is empty
+            num_queues = len(self.steal_queues)
+            for offset in range(1, num_queues):
+                index = (self.index + offset) % num_queues
+                victim = self.steal_queues[index]
+                try:
+                    data = victim.get_nowait()
+                except queue.Empty:
+                    continue
+                if isinstance(data, self._StopToken):
+                    # the victim is stopping, give the token back
+                    victim.put(data)
+                    continue
+                return data, index
+
+            try:
+                return self.input_queue.get(timeout=self._STEAL_INTERVAL), self.index
+            except queue.Empty:
+                if timeout is not None:
+                    raise
+
+
+class _RunnerScheduling:
+    """
+    Runner side of scheduling: sizing chunks, selecting the queue of each chunk, bounding the
+    chunks in flight and adapting the number of producers to the load.
+    """
+
+    # target time spent on a chunk by a producer when `chunksize` is "auto".
+    _AUTO_CHUNK_TIME = 0.05
+    # upper bound of the chunk size when `chunksize` is "auto".
+    _AUTO_MAX_CHUNKSIZE = 1024
+
+    _SCHEDULERS = ("shared", "round_robin", "least_loaded", "throughput")
+
+    # number of chunks in flight for each producer before its first chunk is timed, if
+    # `queue_scale` is None.
+    _AUTO_INITIAL_DEPTH = 3
+
+    # upper bound of the number of chunks in flight for each producer, if `queue_scale` is None.
+    _AUTO_MAX_DEPTH = 64
+
+    # seconds a chunk takes to go through the queues to a producer and back, if `queue_scale` is None.
+    _AUTO_QUEUE_LATENCY = 0.002
+
+    # seconds between two decisions of the autoscaler.
+    _AUTOSCALE_INTERVAL = 1.0
+
+    # number of consecutive idle decisions before the autoscaler removes a producer.
+    _AUTOSCALE_IDLE_STEPS = 5
+
+    # the autoscaler does not add producers when the load average per cpu exceeds this.
+    _AUTOSCALE_MAX_CPU = 0.9
+
+    def _init_scheduling(self, queue_scale, chunksize, scheduler, min_workers, max_workers, max_inflight_bytes):
+        """
+        Check and set the arguments of scheduling, see `BaseRunner`.
+        """
+        if queue_scale is not None and not (isinstance(queue_scale, (int, float)) and queue_scale > 0):
+            raise Exception("parameter `queue_scale` must be a positive number or None.")
+        self.queue_scale = queue_scale
+
+        if chunksize != "auto" and not (isinstance(chunksize, int) and chunksize >= 1):
+            raise Exception("parameter `chunksize` must be a positive int or \"auto\".")
+        self.chunksize = chunksize
+
+        if scheduler not in self._SCHEDULERS:
+            raise Exception("parameter `scheduler` must be one of {}.".format(self._SCHEDULERS))
+        self.scheduler = scheduler
+
+        for name, value in (("min_workers", min_workers), ("max_workers", max_workers)):
+            if value is not None and not (isinstance(value, int) and value >= 1):
+                raise Exception("parameter `{}` must be a positive int or None.".format(name))
+        if min_workers is not None and max_workers is not None and min_workers > max_workers:
+            raise Exception("parameter `min_workers` must not be greater than `max_workers`.")
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+
+        if max_inflight_bytes is not None and not (isinstance(max_inflight_bytes, int) and max_inflight_bytes >= 1):
+            raise Exception("parameter `max_inflight_bytes` must be a positive int or None.")
+        self.max_inflight_bytes = max_inflight_bytes
+        # whether chunks in flight are counted on dispatching
+        self._gated = queue_scale is None or max_inflight_bytes is not None
+
+    def _get_chunksize(self, remaining = None):
+        """
+        Args:
+            remaining (int or None): number of data not dispatched yet, None if unknown.
+
+        Returns:
+            int: size of the next chunk.
+        """
+        if self.chunksize != "auto":
+            return self.chunksize
+
+        # probe with single data until `producer_work` has been timed
+        if self._item_time is None:
+            return 1
+
+        chunksize = int(self._AUTO_CHUNK_TIME / max(self._item_time, 1e-9))
+        if remaining is not None:
+            # guided self-scheduling: shrink chunks towards the end of the data
+            chunksize = min(chunksize, math.ceil(remaining / (2 * max(1, self.num_workers))))
+        return max(1, min(chunksize, self._AUTO_MAX_CHUNKSIZE))
+
+    def _select_queue(self, id, count = 1, block = False):
+        """
+        Args:
+            id (int): id of the chunk to dispatch.
+            count (int): number of data in the chunk.
+            block (bool): whether to wait until a producer is under its in-flight limit, only for
+                the "throughput" scheduler. Never block if results are received in this thread.
+
+        Returns:
+            int: index of the producer input queue to put the chunk.
+        """
+        if self.scheduler == "shared":
+            return 0
+
+        with self._load_condition:
+            active = self._active_workers
+            if self.scheduler == "round_robin":
+                index = active[id % len(active)]
+            elif self.scheduler == "least_loaded":
+                loads = self._queue_loads
+                num_queues = len(self.producer_input_queues)
+                index = min(active, key=lambda i: (loads[i], (i - id) % num_queues))
+            else:
+                index = self._select_by_throughput(count, block)
+            self._queue_loads[index] += 1
+            self._queue_items[index] += count
+        return index
+
+    def _select_by_throughput(self, count, block):
+        """
+        Select the producer expected to finish the chunk first among producers under their
+        in-flight limits. Must be called with `_load_condition` held.
+        """
+        capacity = self._queue_size()
+        while True:
+            active = self._active_workers
+            # producers not measured yet are assumed to be as fast as the fastest one
+            measured = [self._worker_item_times[i] for i in active if self._worker_item_times[i] is not None]
+            default_time = min(measured) if len(measured) else 1.0
+            item_times = {i: default_time if self._worker_item_times[i] is None else self._worker_item_times[i]
+                          for i in active}
+            rates = {i: 1.0 / item_times[i] for i in active}
+            total_rate = sum(rates.values())
+
+            index, finish_time = None, None
+            for i in active:
+                limit = max(1, int(capacity * rates[i] / total_rate))
+                if self._queue_loads[i] >= limit:
+                    continue
+                finish = (self._queue_items[i] + count) * item_times[i]
+                if index is None or finish < finish_time:
+                    index, finish_time = i, finish
+
+            if index is None and not block:
+                index = min(active, key=lambda i: (self._queue_items[i] + count) * item_times[i])
+            if index is not None:
+                return index
+            self._check_error()
+            self._load_condition.wait()
+
+    def _finish_chunk(self, id, count, elapsed, index, nbytes):
+        """
+        Bookkeeping of a chunk or a partial aggregate returned by a producer.
+
+        Args:
+            id (int or list[int]): id of the chunk, or ids of the chunks combined into the partial
+                aggregate.
+            count (int): number of data covered.
+            elapsed (float): seconds spent on the data by the producer.
+            index (int or list[int]): index of the input queue the chunk was dispatched to,
+                or indexes of the chunks combined into the partial aggregate.
+            nbytes (int): estimated bytes of the results.
+        """
+        if self.max_restarts > 0:
+            for i in (id if isinstance(id, list) else [id]):
+                self._pending_chunks.pop(i, None)
+        if self.scheduler != "shared" or self._gated:
+            with self._load_condition:
+                if self._gated:
+                    ids = id if isinstance(id, list) else [id]
+                    for i in ids:
+                        self._inflight_bytes -= self._chunk_nbytes.pop(i, 0)
+                    self._inflight_chunks -= len(ids)
+                    if count:
+                        self._result_nbytes = 0.8 * self._result_nbytes + 0.2 * nbytes / count
+                    if self.queue_scale is None:
+                        chunk_time = elapsed / max(1, len(ids))
+                        if self._chunk_time is None:
+                            self._chunk_time = chunk_time
+                        else:
+                            self._chunk_time = 0.8 * self._chunk_time + 0.2 * chunk_time
+
+                if self.scheduler != "shared":
+                    if isinstance(index, list):
+                        for i in index:
+                            self._queue_loads[i] -= 1
+                        index = index[0]
+                    else:
+                        self._queue_loads[index] -= 1
+                    self._queue_items[index] -= count
+
+                    if self.scheduler == "throughput" and count:
+                        item_time = max(elapsed / count, 1e-9)
+                        if self._worker_item_times[index] is None:
+                            self._worker_item_times[index] = item_time
+                        else:
+                            self._worker_item_times[index] = 0.7 * self._worker_item_times[index] + 0.3 * item_time
+                self._load_condition.notify_all()
+        self._record_chunk_time(count, elapsed)
+
+    def _charge_chunk(self, id, chunk):
+        """
+        Count a chunk as in flight until `_finish_chunk`.
+        """
+        if self.max_restarts > 0:
+            self._pending_chunks[id] = chunk
+        if not self._gated:
+            return
+        nbytes = 0
+        if self.max_inflight_bytes is not None:
+            nbytes = int(_estimate_nbytes(chunk) + len(chunk) * self._result_nbytes)
+        with self._load_condition:
+            self._inflight_chunks += 1
+            self._inflight_bytes += nbytes
+            self._chunk_nbytes[id] = nbytes
+
+    def _inflight_full(self):
+        """
+        Returns:
+            bool: whether dispatching should wait for chunks in flight. Must be called with
+                `_load_condition` held.
+        """
+        if self.queue_scale is None and self._inflight_chunks >= self._queue_size():
+            return True
+        return self.max_inflight_bytes is not None and self._inflight_bytes >= self.max_inflight_bytes
+
+    def _is_inflight_full(self):
+        if not self._gated:
+            return False
+        with self._load_condition:
+            return self._inflight_full()
+
+    def _wait_inflight(self):
+        """
+        Wait until chunks in flight are within the limits of `queue_scale` and `max_inflight_bytes`.
+        """
+        if not self._gated:
+            return
+        with self._load_condition:
+            if not self._inflight_full():
+                return
+            self._dispatch_blocked.value = 1
+            try:
+                while self._inflight_full():
+                    self._check_error()
+                    self._load_condition.wait()
+            finally:
+                self._dispatch_blocked.value = 0
+
+    def _record_chunk_time(self, chunk_len, elapsed):
+        """
+        Update the moving average of time spent on each data by `producer_work`.
+        """
+        if self.chunksize != "auto" or chunk_len == 0:
+            return
+        item_time = elapsed / chunk_len
+        if self._item_time is None:
+            self._item_time = item_time
+        else:
+            self._item_time = 0.8 * self._item_time + 0.2 * item_time
+
+    def _queue_size(self):
+        if self.queue_scale is None:
+            if self._chunk_time is None:
+                depth = self._AUTO_INITIAL_DEPTH
+            else:
+                # enough chunks for each producer to cover the latency of the queues
+                depth = 1 + math.ceil(self._AUTO_QUEUE_LATENCY / max(self._chunk_time, 1e-9))
+                depth = max(2, min(depth, self._AUTO_MAX_DEPTH))
+            if self.max_batch_size is not None:
+                # enough chunks for each producer to fill a batch
+                depth = max(depth, math.ceil(self.max_batch_size / self._get_chunksize()))
+            return max(1, self.num_workers * depth)
+        num_workers = self.max_workers if self.max_workers is not None else len(self.devices)
+        return max(1, int(num_workers * self.queue_scale))
+
+    def _autoscale(self):
+        """
+        Thread adapting the number of producers to the load between `min_workers` and
+        `max_workers`.
+        """
+        min_workers = self.min_workers if self.min_workers is not None else 1
+        idle_steps = 0
+        dispatched = self._dispatched
+        while not self._autoscale_stop.wait(self._AUTOSCALE_INTERVAL):
+            with self._resize_lock:
+                self._reap_workers()
+                num_workers = self.num_workers
+            if self.scheduler == "shared":
+                waiting = _qsize(self.producer_input_queue) - self._pending_stops
+            else:
+                with self._load_condition:
+                    # each producer holds one chunk in process
+                    waiting = sum(max(0, self._queue_loads[index] - 1) for index in self._active_workers)
+            backlog = _qsize(self.producer_output_queue)
+            cpu = _cpu_utilization()
+            idle = self._dispatched == dispatched and waiting <= 0
+            dispatched = self._dispatched
+
+            idle_steps = idle_steps + 1 if idle else 0
+            if waiting >= num_workers and backlog < self._queue_size() // 2 and \
+                    (cpu is None or cpu < self._AUTOSCALE_MAX_CPU) and num_workers < self.max_workers:
+                # producers can not keep up with dispatching while the consumer can
+                self._resize(num_workers + 1)
+            elif idle_steps >= self._AUTOSCALE_IDLE_STEPS and num_workers > min_workers:
+                self._resize(num_workers - 1)
+                idle_steps = 0
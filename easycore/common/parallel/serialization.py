@@ -0,0 +1,138 @@
+import pickle
+from easycore.common.registry import Registry
+
+__all__ = ["SERIALIZER_REGISTRY", "Serializer", "PickleSerializer", "Pickle5Serializer",
+           "CloudpickleSerializer", "MsgpackSerializer", "get_serializer"]
+
+SERIALIZER_REGISTRY = Registry("SERIALIZER")
+
+
+class Serializer:
+    """
+    Converts the chunks of data and results crossing the queues between a runner and its producer
+    processes. The payload returned by `dumps` is put into a `multiprocessing.Queue`, which pickles
+    it again, so it should be bytes or a tuple of bytes-like objects that pickle cheaply.
+
+    Serializers are sent to producers, so they must be picklable.
+    """
+
+    # whether the producer functions are also serialized by value, see `BaseRunner`.
+    serialize_functions = False
+
+    def dumps(self, obj):
+        """
+        Args:
+            obj (Any): a chunk of data or results.
+
+        Returns:
+            Any: payload to put into the queue.
+        """
+        raise NotImplementedError
+
+    def loads(self, payload):
+        """
+        Args:
+            payload (Any): payload returned by `dumps`.
+
+        Returns:
+            Any: the object.
+        """
+        raise NotImplementedError
+
+
+@SERIALIZER_REGISTRY.register("pickle")
+class PickleSerializer(Serializer):
+    """
+    Pickle with the highest protocol, buffers are copied into the pickled bytes.
+    """
+
+    def dumps(self, obj):
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, payload):
+        return pickle.loads(payload)
+
+
+@SERIALIZER_REGISTRY.register("pickle5")
+class Pickle5Serializer(Serializer):
+    """
+    Pickle protocol 5 with out-of-band buffers: the buffers of numpy arrays and `pickle.PickleBuffer`
+    objects are kept out of the pickled bytes and sent as separate bytes frames. Received arrays are
+    rebuilt on top of the frames instead of being copied out of the pickled bytes, so they are
+    read-only. It is not zero-copy: the buffers are copied into the frames, which the queues pickle
+    like any payload.
+    """
+
+    def __init__(self):
+        if pickle.HIGHEST_PROTOCOL < 5:
+            raise Exception("pickle protocol 5 requires python>=3.8.")
+
+    def dumps(self, obj):
+        buffers = []
+        data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        # queues pickle with protocol 4, which does not support `PickleBuffer`, so the buffers
+        # are copied into bytes
+        return data, [buffer.raw().tobytes() for buffer in buffers]
+
+    def loads(self, payload):
+        data, buffers = payload
+        return pickle.loads(data, buffers=buffers)
+
+
+@SERIALIZER_REGISTRY.register("cloudpickle")
+class CloudpickleSerializer(Serializer):
+    """
+    cloudpickle, which serializes lambdas, closures and classes defined in `__main__` by value.
+    The producer functions are serialized with it too, so they can be lambdas or closures with the
+    "spawn" and "forkserver" start methods.
+    """
+
+    serialize_functions = True
+
+    def __init__(self):
+        # fail early if cloudpickle is unavailable
+        import cloudpickle
+
+    def dumps(self, obj):
+        import cloudpickle
+        return cloudpickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, payload):
+        return pickle.loads(payload)
+
+
+@SERIALIZER_REGISTRY.register("msgpack")
+class MsgpackSerializer(Serializer):
+    """
+    msgpack, compact and fast for data made of None, bool, int, float, str, bytes, lists and dicts.
+    Tuples are received as lists, and other types are not supported.
+    """
+
+    def __init__(self):
+        # fail early if msgpack is unavailable
+        import msgpack
+
+    def dumps(self, obj):
+        import msgpack
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, payload):
+        import msgpack
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+def get_serializer(serializer):
+    """
+    Args:
+        serializer (str or Serializer): name registered in `SERIALIZER_REGISTRY` ("pickle",
+            "pickle5", "cloudpickle", "msgpack") or a serializer.
+
+    Returns:
+        Serializer:
+    """
+    if isinstance(serializer, Serializer):
+        return serializer
+    if not SERIALIZER_REGISTRY.is_registered(serializer):
+        raise Exception("parameter `serializer` must be a `Serializer` or one of {}.".format(
+            SERIALIZER_REGISTRY.registered_names()))
+    return SERIALIZER_REGISTRY.get(serializer)()
@@ -0,0 +1,377 @@
+import math
+import pickle
+import time
+from collections import namedtuple
+from typing import Any, Dict, List
+from easycore.common.parallel.metrics import _trace_async_event
+from easycore.common.parallel.scheduling import _estimate_nbytes
+from easycore.common.parallel.serialization import PickleSerializer, get_serializer
+
+__all__ = ["SharedMemoryWriter", "SharedMemoryReader"]
+
+
+# descriptor of a numpy array placed in a shared memory segment.
+_SharedArray = namedtuple("_SharedArray", ["owner", "name", "shape", "dtype"])
+
+
+def _import_shared_memory():
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise ImportError("shared memory transport requires python>=3.8.")
+    return shared_memory
+
+
+def _walk(obj, func):
+    """
+    Apply `func` to each leaf of a possibly-nested list, tuple or dict.
+    """
+    if isinstance(obj, list):
+        return [_walk(item, func) for item in obj]
+    elif isinstance(obj, tuple) and not hasattr(obj, "_fields"):
+        return tuple(_walk(item, func) for item in obj)
+    elif isinstance(obj, dict) and type(obj) is dict:
+        return {key: _walk(value, func) for key, value in obj.items()}
+    return func(obj)
+
+
+class SharedMemoryWriter:
+    """
+    Producer side of the shared memory transport.
+
+    Numpy arrays in the output of `producer_work` are copied into shared memory segments and
+    replaced with small descriptors. Segments are pooled by size and recycled once the consumer
+    releases them. With a `prefix`, segments are named by the prefix and their number, so that
+    the consumer can unlink them if the producer dies, see `SharedMemoryReader.unlink_writer`.
+    """
+
+    def __init__(self, owner:int, release_queue, min_nbytes:int = 65536, prefix:str = None):
+        """
+        Args:
+            owner (int): index of the producer which owns the segments.
+            release_queue (multiprocessing.Queue): queue to receive names of released segments.
+            min_nbytes (int): arrays smaller than this are sent through the queue as usual.
+            prefix (str or None): prefix of the names of the segments, unique to this writer.
+                None means random names.
+        """
+        import numpy as np
+        self._np = np
+        self._shared_memory = _import_shared_memory()
+        self.owner = owner
+        self.release_queue = release_queue
+        self.min_nbytes = min_nbytes
+        self.prefix = prefix
+        self._segments: Dict[str, Any] = {}
+        self._free: Dict[int, List[Any]] = {}
+
+    def _collect_released(self):
+        while True:
+            try:
+                name = self.release_queue.get_nowait()
+            except Exception:
+                break
+            segment = self._segments.get(name)
+            if segment is not None:
+                self._free.setdefault(segment.size, []).append(segment)
+
+    def _allocate(self, nbytes:int):
+        size = 1 << max(12, math.ceil(math.log2(max(nbytes, 1))))
+        free_list = self._free.get(size)
+        if not free_list:
+            self._collect_released()
+            free_list = self._free.get(size)
+        if free_list:
+            return free_list.pop()
+        name = None if self.prefix is None else "{}{}".format(self.prefix, len(self._segments))
+        segment = self._shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._segments[segment.name] = segment
+        return segment
+
+    def _encode_array(self, obj):
+        np = self._np
+        if not isinstance(obj, np.ndarray) or obj.dtype.hasobject or obj.nbytes < self.min_nbytes:
+            return obj
+        segment = self._allocate(obj.nbytes)
+        view = np.ndarray(obj.shape, dtype=obj.dtype, buffer=segment.buf)
+        view[...] = obj
+        del view
+        return _SharedArray(self.owner, segment.name, obj.shape, obj.dtype.str)
+
+    def encode(self, data):
+        """
+        Args:
+            data (Any): output of `producer_work`.
+
+        Returns:
+            Any: data whose large numpy arrays are replaced with shared memory descriptors.
+        """
+        return _walk(data, self._encode_array)
+
+    def close(self):
+        """
+        Release and unlink all segments owned by this writer.
+        """
+        for segment in self._segments.values():
+            segment.close()
+            segment.unlink()
+        self._segments.clear()
+        self._free.clear()
+
+
+class SharedMemoryReader:
+    """
+    Consumer side of the shared memory transport.
+
+    Descriptors are replaced with numpy views of the shared memory segments without copies.
+    The views are only valid until the segments are released, so `consumer_work` must copy the
+    arrays it keeps.
+    """
+
+    def __init__(self, release_queues):
+        """
+        Args:
+            release_queues (list[multiprocessing.Queue]): release queue of each producer.
+        """
+        import numpy as np
+        self._np = np
+        self._shared_memory = _import_shared_memory()
+        self.release_queues = release_queues
+
+        # share one resource tracker with producers created after the reader, otherwise the
+        # tracker of this process would unlink segments which are already unlinked by producers.
+        from multiprocessing import resource_tracker
+        resource_tracker.ensure_running()
+        self._segments: Dict[str, Any] = {}
+        self._in_use: List[_SharedArray] = []
+
+    def _view(self, obj):
+        segment = self._segments.get(obj.name)
+        if segment is None:
+            segment = self._shared_memory.SharedMemory(name=obj.name)
+            self._segments[obj.name] = segment
+        return self._np.ndarray(obj.shape, dtype=self._np.dtype(obj.dtype), buffer=segment.buf)
+
+    def _decode_array(self, obj):
+        if not isinstance(obj, _SharedArray):
+            return obj
+        self._in_use.append(obj)
+        return self._view(obj)
+
+    def _copy_array(self, obj):
+        if not isinstance(obj, _SharedArray):
+            return obj
+        array = self._view(obj).copy()
+        # the segment is not referenced anymore, give it back at once
+        self.release_queues[obj.owner].put(obj.name)
+        return array
+
+    def decode(self, data, copy:bool = False):
+        """
+        Args:
+            data (Any): data encoded by :class:`SharedMemoryWriter`.
+            copy (bool): copy the arrays out of the shared memory and give the segments back to
+                their producers at once, for data kept after `release`.
+
+        Returns:
+            Any: data with numpy views of the shared memory segments, or copies of them.
+        """
+        return _walk(data, self._copy_array if copy else self._decode_array)
+
+    def unlink_writer(self, prefix:str):
+        """
+        Unlink the segments of a dead writer created with `prefix`. They stay mapped until the
+        reader is closed, so results the writer sent before it died can still be decoded.
+
+        Returns:
+            int: number of segments of the writer.
+        """
+        count = 0
+        while True:
+            name = "{}{}".format(prefix, count)
+            segment = self._segments.get(name)
+            if segment is None:
+                try:
+                    segment = self._shared_memory.SharedMemory(name=name)
+                except FileNotFoundError:
+                    # segments are numbered in the order they are created
+                    return count
+                self._segments[name] = segment
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+            count += 1
+
+    def release(self):
+        """
+        Give back all segments decoded since the last release to their producers.
+        """
+        for obj in self._in_use:
+            self.release_queues[obj.owner].put(obj.name)
+        self._in_use = []
+
+    def close(self):
+        """
+        Detach from all segments.
+        """
+        for segment in self._segments.values():
+            try:
+                segment.close()
+            except BufferError:
+                # views of the segment are still referenced by user
+                pass
+        self._segments.clear()
+        self._in_use = []
+
+
+class _ProducerTransport:
+    """
+    Producer side of the transport: deserializing chunks, and serializing results or placing
+    their arrays in shared memory before sending them.
+    """
+
+    def _setup_transport(self, serializer = None, pickle_results = False, measure_nbytes = False,
+                         shm_release_queue = None, shm_prefix = None):
+        """
+        Args:
+            serializer (Serializer or None): serializer of chunks and results, None if the queues
+                pickle them.
+            pickle_results (bool): pickle results here with `metrics`, to time the serialization.
+            measure_nbytes (bool): estimate the bytes of results, see `max_inflight_bytes`.
+            shm_release_queue (multiprocessing.Queue or None): queue of the segments released by
+                the consumer, None if arrays are not sent through shared memory.
+            shm_prefix (str or None): prefix of the names of the shared memory segments, see
+                `SharedMemoryWriter`.
+        """
+        self.serializer = serializer
+        self.pickle_results = pickle_results
+        self.measure_nbytes = measure_nbytes
+        self.shm_release_queue = shm_release_queue
+        self.shm_prefix = shm_prefix
+
+    def _create_shm_writer(self):
+        """
+        Returns:
+            SharedMemoryWriter or None: writer of the arrays of results, None if arrays are not
+                sent through shared memory.
+        """
+        if self.shm_release_queue is None:
+            return None
+        return SharedMemoryWriter(self.index, self.shm_release_queue, prefix=self.shm_prefix)
+
+    def _get_task(self, timeout = None):
+        """
+        Args:
+            timeout (float or None): raise `queue.Empty` if no task is got in about `timeout`
+                seconds. None means waiting until a task is got.
+
+        Returns:
+            tuple: task with its chunk deserialized and index of the queue it comes from.
+        """
+        data, index = self._take_task(timeout)
+        if self.serializer is not None and not isinstance(data, self._StopToken):
+            data = (data[0], self.serializer.loads(data[1])) + tuple(data[2:])
+        return data, index
+
+    def _send(self, shm_writer, id, chunk, elapsed, index, count, queue_wait):
+        """
+        Put processed data into the output queue.
+        """
+        nbytes = _estimate_nbytes(chunk) if self.measure_nbytes else 0
+        if shm_writer is not None:
+            chunk = shm_writer.encode(chunk)
+        timing = None
+        serialize = None
+        if self.serializer is not None:
+            start = time.perf_counter()
+            chunk = self.serializer.dumps(chunk)
+            serialize = time.perf_counter() - start
+        elif self.metrics and self.pickle_results:
+            start = time.perf_counter()
+            chunk = pickle.dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL)
+            serialize = time.perf_counter() - start
+        if self.metrics:
+            timing = (self.index, queue_wait, serialize, time.time())
+        if self.trace:
+            for i in (id if isinstance(id, list) else [id]):
+                self._events.append(_trace_async_event("output_queue", "b", time.time(), self.trace_pid, i))
+            self.report_queue.put(("trace", self._events))
+            self._events = []
+        self.output_queue.put((id, chunk, elapsed, index, count, nbytes, timing))
+
+
+class _RunnerTransport:
+    """
+    Runner side of the transport: serializing chunks, and deserializing results or reading their
+    arrays from shared memory.
+    """
+
+    def _init_transport(self, shared_memory, serializer):
+        """
+        Check and set the arguments of the transport, see `BaseRunner`. Must be called after
+        `backend` and `metrics` are set.
+        """
+        if shared_memory:
+            # fail early if numpy or shared memory is unavailable
+            import numpy
+            _import_shared_memory()
+            if self.backend == "thread":
+                raise Exception("`shared_memory` is useless with the thread backend.")
+        self.shared_memory = shared_memory
+
+        if serializer is not None and self.backend == "thread":
+            raise Exception("`serializer` is useless with the thread backend.")
+        self.serializer = serializer
+        self._serializer = get_serializer(serializer) if serializer is not None else None
+        # results are serialized by producers with a serializer, or to time the serialization
+        if self._serializer is None and self.metrics and self.backend == "process":
+            self._result_serializer = PickleSerializer()
+        else:
+            self._result_serializer = self._serializer
+
+    def _encode_chunk(self, chunk):
+        """
+        Returns:
+            Any: the chunk serialized for producers if the runner has a serializer.
+        """
+        if self._serializer is not None:
+            return self._serializer.dumps(chunk)
+        return chunk
+
+    def _deserialize(self, chunk, elapsed, count, timing):
+        """
+        Returns:
+            list: the chunk of results, deserialized if it is serialized by the producer, after
+                recording the timings sent by the producer with `metrics`.
+        """
+        deserialize = None
+        if self._result_serializer is not None:
+            start = time.perf_counter()
+            chunk = self._result_serializer.loads(chunk)
+            deserialize = time.perf_counter() - start
+        if timing is not None:
+            self._record_timing(elapsed, count, timing, deserialize)
+        return chunk
+
+    def _record_timing(self, elapsed, count, timing, deserialize):
+        """
+        Record the timings sent by a producer with `metrics`.
+        """
+        worker, queue_wait, serialize, sent = timing
+        self._metrics.add("transit", max(0.0, time.time() - sent), count)
+        if queue_wait is not None:
+            self._metrics.add("queue_wait", max(0.0, queue_wait), count)
+        self._metrics.add("work", elapsed, count)
+        self._metrics.add_work(worker, elapsed, count)
+        if serialize is not None:
+            self._metrics.add("serialize", serialize, count)
+            self._metrics.add("deserialize", deserialize, count)
+
+    def _decode_chunk(self, chunk, copy = False):
+        if self._shm_reader is not None:
+            chunk = self._shm_reader.decode(chunk, copy)
+        return chunk
+
+    def _release_from_consumer(self):
+        if self._shm_reader is not None:
+            self._shm_reader.release()
@@ -14,5 +14,10 @@ setup(
         "pyyaml",
         "tqdm",
         "portalocker>=1.6.0",
-    ]
+    ],
+    entry_points = {
+        "console_scripts": [
+            "easycore-agent = easycore.common.parallel.agent:main",
+        ],
+    },
 )
@@ -0,0 +1,46 @@
+import os
+import pytest
+from easycore.common.parallel import OrderedRunner
+from easycore.common.parallel.affinity import available_cpus, numa_nodes, worker_cpus
+
+class AffinityRunner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return sorted(os.sched_getaffinity(0))
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.consumer_cpus = sorted(os.sched_getaffinity(0))
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.consumer_cpus
+
+
+def test_worker_cpus():
+    nodes = [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert [worker_cpus("spread", index, nodes) for index in range(4)] == [{0}, {4}, {1}, {5}]
+    assert [worker_cpus("compact", index, nodes) for index in range(4)] == [{0}, {1}, {2}, {3}]
+    assert worker_cpus("compact", 9, nodes) == {1}
+    assert [worker_cpus([[0, 1], 2], index) for index in range(3)] == [{0, 1}, {2}, {0, 1}]
+
+    assert sorted(cpu for node in numa_nodes() for cpu in node) == available_cpus()
+
+
+def test_affinity():
+    cpus = available_cpus()
+    for affinity in ["spread", "compact", [cpus[-1:]]]:
+        for backend in ["process", "thread"]:
+            runner = AffinityRunner(2, affinity=affinity, backend=backend)
+            for result in runner.imap(range(10)):
+                assert len(result) == 1 and result[0] in cpus
+            consumer_cpus = runner(range(4))
+            if len(cpus) > 2:
+                assert not set(consumer_cpus) & set(cpu for result in runner.imap(range(10)) for cpu in result)
+            runner.close()
+
+    with pytest.raises(Exception):
+        AffinityRunner(1, affinity="scatter")
+    with pytest.raises(Exception):
+        AffinityRunner(1, affinity=[[max(cpus) + 1]])
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from easycore.common.config import CfgNode
+from easycore.common.parallel import OrderedRunner, UnorderedRunner
+
+class Runner(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+
+async def agenerator(data_list):
+    for data in data_list:
+        await asyncio.sleep(0)
+        yield data
+
+
+async def slow_source():
+    yield 1
+    await asyncio.sleep(1)
+    yield 2
+
+
+def test_submit():
+    runner = Runner(3)
+    data_list = list(range(100))
+
+    async def main():
+        return await asyncio.gather(*[runner.submit(data) for data in data_list])
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(main()) == [data * data for data in data_list]
+    finally:
+        loop.close()
+
+    runner.close()
+
+
+def test_amap():
+    runner = Runner(3)
+    data_list = list(range(100))
+
+    async def main():
+        ordered = [data async for data in runner.amap(agenerator(data_list), max_inflight=5)]
+        unordered = [data async for data in runner.amap_unordered(data_list)]
+        return ordered, unordered
+
+    loop = asyncio.new_event_loop()
+    try:
+        ordered, unordered = loop.run_until_complete(main())
+    finally:
+        loop.close()
+
+    assert ordered == [data * data for data in data_list]
+    assert sorted(unordered) == [data * data for data in data_list]
+
+    # the runner still works synchronously
+    assert list(runner.imap(data_list)) == [data * data for data in data_list]
+
+    runner.close()
+
+
+def test_amap_slow_source():
+    runner = Runner(2)
+
+    async def first_result(results):
+        start = time.time()
+        try:
+            async for data in results:
+                if data == 1:
+                    return time.time() - start
+        finally:
+            await results.aclose()
+
+    async def main():
+        # results are yielded while the next data is awaited
+        return [await first_result(runner.amap(slow_source())),
+                await first_result(runner.amap_unordered(slow_source()))]
+
+    loop = asyncio.new_event_loop()
+    try:
+        latencies = loop.run_until_complete(main())
+    finally:
+        loop.close()
+    assert max(latencies) < 0.5
+
+    runner.close()
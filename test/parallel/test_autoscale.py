@@ -0,0 +1,96 @@
+import asyncio
+import time
+from easycore.common.parallel import OrderedRunner, UnorderedRunner
+
+class Runner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.data_list.append(data)
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+def test_resize():
+    data_list = list(range(100))
+    for scheduler in ["shared", "round_robin", "least_loaded", "throughput"]:
+        runner = Runner(2, scheduler=scheduler)
+        assert runner.num_workers == 2
+        runner.resize(4)
+        assert runner.num_workers == 4
+        assert runner(data_list) == [data * data for data in data_list]
+        runner.resize(1)
+        assert runner.num_workers == 1
+        assert runner(data_list) == [data * data for data in data_list]
+        runner.resize(3)
+        assert runner.num_workers == 3
+        assert runner(data_list) == [data * data for data in data_list]
+        runner.close()
+
+
+class SleepRunner(UnorderedRunner):
+    _AUTOSCALE_INTERVAL = 0.05
+    _AUTOSCALE_IDLE_STEPS = 2
+    _AUTOSCALE_MAX_CPU = float("inf")
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        time.sleep(0.01)
+        return data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.count = 0
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.count += 1
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.count
+
+
+def test_autoscale():
+    runner = SleepRunner(1, backend="thread", min_workers=1, max_workers=4)
+    assert runner.num_workers == 1
+    assert runner(range(200)) == 200
+    assert runner.num_workers > 1
+
+    # shrink back to `min_workers` when idle
+    deadline = time.time() + 5.0
+    while runner.num_workers > 1 and time.time() < deadline:
+        time.sleep(0.05)
+    assert runner.num_workers == 1
+    assert runner(range(10)) == 10
+    runner.close()
+
+
+def test_autoscale_submit():
+    runner = SleepRunner(4, backend="thread", min_workers=1, max_workers=4)
+
+    async def main():
+        # steady load leaving the input queue empty most of the time
+        deadline = time.time() + 1.0
+        while time.time() < deadline:
+            assert await runner.submit(1) == 1
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+
+    # submitted data count as traffic, the runner is not considered idle
+    assert runner.num_workers == 4
+    runner.close()
@@ -0,0 +1,55 @@
+from easycore.common.parallel import OrderedRunner, UnorderedRunner
+
+class Runner(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return len(data)
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.sum = 0
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.sum += data
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.sum
+
+    def _charge_chunk(self, id, chunk):
+        super(Runner, self)._charge_chunk(id, chunk)
+        self.max_bytes_seen = max(getattr(self, "max_bytes_seen", 0), self._inflight_bytes)
+
+
+def test_max_inflight_bytes():
+    item = b"x" * 10000
+    for backend in ["process", "thread"]:
+        runner = Runner(2, backend=backend, max_inflight_bytes=50000)
+        assert runner([item] * 100) == 10000 * 100
+        # dispatching waits once the bound is exceeded, by one chunk at most
+        assert runner.max_bytes_seen < 50000 + 2 * len(item)
+        assert runner._inflight_chunks == 0 and runner._inflight_bytes == 0
+        runner.close()
+
+
+class SquareRunner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+
+def test_auto_queue_size():
+    data_list = list(range(1000))
+    runner = SquareRunner(2)
+    assert list(runner.imap(data_list)) == [data * data for data in data_list]
+    # cheap data get deep queues
+    assert runner._queue_size() > 2 * runner._AUTO_INITIAL_DEPTH
+    runner.close()
+
+    runner = SquareRunner(2, queue_scale=2.0, max_inflight_bytes=None)
+    assert list(runner.imap(data_list)) == [data * data for data in data_list]
+    assert runner._queue_size() == 4
+    runner.close()
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+import pytest
+from easycore.common.parallel import OrderedRunner, UnorderedRunner
+
+class BatchSquare(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, batch):
+        assert isinstance(batch, list) and 1 <= len(batch) <= 8
+        return [(len(batch), data * data) for data in batch]
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.data_list.append(data)
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+class SlowBatch(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, batch):
+        time.sleep(0.05)
+        return [len(batch)] * len(batch)
+
+
+class WrongBatch(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, batch):
+        return batch[:1]
+
+
+def test_batching():
+    data_list = list(range(200))
+    for kwargs in [{}, {"chunksize": 3}, {"chunksize": 20}, {"scheduler": "round_robin"}, {"backend": "thread"}]:
+        runner = BatchSquare(2, max_batch_size=8, max_wait_ms=20, **kwargs)
+        results = runner(data_list)
+        assert [data for size, data in results] == [data * data for data in data_list]
+        # items submitted one by one are coalesced
+        assert max(size for size, data in results) > 1
+        assert [data for size, data in runner.imap(iter(data_list))] == [data * data for data in data_list]
+        runner.close()
+
+
+def test_batching_full():
+    # with default options, enough data are in flight to fill the batches of slow producers
+    for kwargs in [{}, {"scheduler": "round_robin"}, {"backend": "thread"}]:
+        runner = SlowBatch(2, max_batch_size=16, max_wait_ms=1000, **kwargs)
+        start = time.time()
+        sizes = list(runner.imap(range(320)))
+        assert sum(sizes) / len(sizes) >= 12
+        # batches are not held waiting for data which can not be dispatched
+        runner(range(4))
+        assert time.time() - start < 5
+        runner.close()
+
+
+def test_batching_submit():
+    runner = BatchSquare(1, max_batch_size=8, max_wait_ms=50)
+
+    async def submit_all():
+        return await asyncio.gather(*[runner.submit(data) for data in range(32)])
+
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(submit_all())
+    finally:
+        loop.close()
+    assert [data for size, data in results] == [data * data for data in range(32)]
+    assert max(size for size, data in results) > 1
+    runner.close()
+
+
+def test_batching_errors():
+    with pytest.raises(Exception):
+        BatchSquare(1, max_batch_size=0)
+    with pytest.raises(Exception):
+        BatchSquare(1, max_batch_size=4, max_wait_ms=-1)
+
+    runner = WrongBatch(1, max_batch_size=4, max_wait_ms=10, backend="thread", max_restarts=0)
+    with pytest.raises(Exception):
+        runner(range(10))
+    runner.close()
@@ -0,0 +1,133 @@
+import os
+import time
+import tempfile
+from easycore.common.config import CfgNode
+from easycore.common.parallel import OrderedRunner
+from easycore.common.parallel.cache import ResultCache
+
+calls = []
+
+class Runner(OrderedRunner):
+
+    @staticmethod
+    def producer_init(device, cfg):
+        # not part of the key, the cache is keyed by the cfg given to the runner
+        cfg.state = object()
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        calls.append(data)
+        return data * cfg.scale
+
+
+class BatchRunner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, batch):
+        calls.extend(batch)
+        return [data * cfg.scale for data in batch]
+
+
+def test_cache():
+    path = tempfile.mkdtemp()
+    cfg = CfgNode({"scale": 2, "verbose": False})
+    for backend in ["thread", "process"]:
+        runner = Runner(2, cfg=cfg, cache=path, backend=backend, chunksize=3)
+        assert list(runner.imap(range(20))) == [data * 2 for data in range(20)]
+        runner.close()
+
+    calls.clear()
+    runner = Runner(2, cfg=cfg, cache=path, backend="thread")
+    assert list(runner.imap(range(30))) == [data * 2 for data in range(30)]
+    # only new data are computed
+    assert sorted(calls) == list(range(20, 30))
+    runner.close()
+
+    # other cfg, other results
+    calls.clear()
+    runner = Runner(2, cfg=CfgNode({"scale": 3, "verbose": False}), cache=path, backend="thread")
+    assert list(runner.imap(range(10))) == [data * 3 for data in range(10)]
+    assert sorted(calls) == list(range(10))
+    runner.close()
+
+    # keys of cfg which do not change the results
+    cache = ResultCache(path, cfg_keys=["scale"])
+    runner = Runner(1, cfg=CfgNode({"scale": 2, "verbose": False}), cache=cache, backend="thread")
+    runner(range(10))
+    runner.close()
+    calls.clear()
+    runner = Runner(1, cfg=CfgNode({"scale": 2, "verbose": True}), cache=cache, backend="thread")
+    assert list(runner.imap(range(10))) == [data * 2 for data in range(10)]
+    assert calls == []
+    runner.close()
+
+
+def test_cache_batching():
+    path = tempfile.mkdtemp()
+    cfg = CfgNode({"scale": 2})
+    runner = BatchRunner(1, cfg=cfg, cache=path, backend="thread", max_batch_size=4, max_wait_ms=5)
+    assert list(runner.imap(range(0, 20, 2))) == [data * 2 for data in range(0, 20, 2)]
+    calls.clear()
+    assert list(runner.imap(range(20))) == [data * 2 for data in range(20)]
+    assert sorted(calls) == list(range(1, 20, 2))
+    runner.close()
+
+
+def test_cache_eviction():
+    cache = ResultCache(tempfile.mkdtemp(), max_bytes=20000).bind(Runner, CfgNode())
+    payload = b"x" * 1000
+    for data in range(10):
+        cache.put(data, payload)
+        time.sleep(0.01)
+    assert cache.get(0) == (True, payload)
+    for data in range(10, 30):
+        cache.put(data, payload)
+        time.sleep(0.01)
+    assert cache.size() <= 20000
+    # least recently used results are evicted first
+    order = list(range(1, 10)) + [0] + list(range(10, 30))
+    kept = [cache.get(data)[0] for data in order]
+    assert kept == sorted(kept) and 10 <= sum(kept) < 30
+
+    cache.clear()
+    assert cache.size() == 0
+    assert cache.get(29) == (False, None)
+
+    # results of another version are not used
+    other = ResultCache(cache.path, version="2").bind(Runner, CfgNode())
+    cache.put("data", 1)
+    assert other.get("data") == (False, None)
+
+
+def test_cache_eviction_producers():
+    # the size of the results is shared by the producers of a runner
+    cache = ResultCache(tempfile.mkdtemp(), max_bytes=20000)
+    runner = Runner(4, cfg=CfgNode({"scale": 1}), cache=cache, chunksize=2)
+    # more than `max_bytes` of results, but less for each producer
+    data_list = [bytes([data]) * 1000 for data in range(36)]
+    assert list(runner.imap(data_list)) == data_list
+    runner.close()
+    assert 10000 <= cache.size() <= 20000
+
+
+class Gone:
+    pass
+
+
+def test_cache_unloadable():
+    cache = ResultCache(tempfile.mkdtemp()).bind(Runner, CfgNode())
+    cache.put(0, b"data")
+    # a corrupted file
+    with open(cache._file(0), "wb") as f:
+        f.write(b"garbage")
+    assert cache.get(0) == (False, None)
+    assert not os.path.exists(cache._file(0))
+
+    # a result of a class which is gone
+    cache.put(1, Gone())
+    gone = globals().pop("Gone")
+    try:
+        assert cache.get(1) == (False, None)
+        assert not os.path.exists(cache._file(1))
+    finally:
+        globals()["Gone"] = gone
@@ -0,0 +1,65 @@
+from easycore.common.config import CfgNode
+from easycore.common.parallel import OrderedRunner, UnorderedRunner
+
+class Runner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.data_list.append(data)
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+class SumRunner(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.sum = 0
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.sum += data
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.sum
+
+
+def test_fixed_chunksize():
+    runner = Runner(3, chunksize=7)
+
+    data_list = list(range(100))
+
+    assert runner(data_list) == [data * data for data in data_list]
+    assert runner(iter(data_list)) == [data * data for data in data_list]
+
+    runner.close()
+
+
+def test_auto_chunksize():
+    runner = Runner(3, chunksize="auto")
+
+    data_list = list(range(1000))
+
+    assert runner(data_list) == [data * data for data in data_list]
+    assert runner(iter(data_list)) == [data * data for data in data_list]
+
+    runner.close()
+
+    runner = SumRunner(3, chunksize="auto")
+    assert runner(data_list) == sum([data * data for data in data_list])
+    runner.close()
@@ -0,0 +1,42 @@
+from easycore.common.config import CfgNode
+from easycore.common.parallel import UnorderedRunner
+
+class HistogramRunner(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data % 10
+
+    @staticmethod
+    def producer_combine(device, cfg, partial, data):
+        if partial is None:
+            partial = [0] * 10
+        partial[data] += 1
+        return partial
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.histogram = [0] * 10
+        cfg.num_partials = 0
+
+    @staticmethod
+    def consumer_merge(cfg, partial):
+        cfg.histogram = [a + b for a, b in zip(cfg.histogram, partial)]
+        cfg.num_partials += 1
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.histogram, cfg.num_partials
+
+
+def test_combine():
+    data_list = list(range(1000))
+    for kwargs in [dict(), dict(chunksize=16, scheduler="least_loaded"), dict(combine_interval=100)]:
+        runner = HistogramRunner(3, **kwargs)
+
+        for _ in range(2):
+            histogram, num_partials = runner(data_list)
+            assert histogram == [100] * 10
+            assert num_partials < len(data_list)
+
+        runner.close()
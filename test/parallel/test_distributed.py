@@ -0,0 +1,159 @@
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import pytest
+from easycore.common.config import CfgNode
+from easycore.common.parallel import OrderedRunner, UnorderedRunner, DistributedRunner
+from easycore.common.parallel.distributed import run_agent
+
+class OrderedScale(OrderedRunner):
+
+    @staticmethod
+    def producer_init(device, cfg):
+        cfg.pid = os.getpid()
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        if data == "bad":
+            raise ValueError("bad data")
+        if cfg.get("slow", False):
+            time.sleep(0.01)
+        return data * cfg.scale
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.data_list.append(data)
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+class UnorderedScale(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * cfg.scale
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.sum = 0
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.sum += data
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.sum
+
+
+class NamedLikeOrdered(UnorderedScale):
+    pass
+
+# an unrelated class named like OrderedRunner, it is still pickled by its qualified name
+NamedLikeOrdered.__name__ = "OrderedRunner"
+
+
+def start_agents(runner, count, authkey = None):
+    agents = [mp.Process(target=run_agent, args=(runner.address, authkey, "cpu")) for _ in range(count)]
+    for agent in agents:
+        agent.start()
+    assert runner.wait_agents(count, timeout=30)
+    return agents
+
+
+def stop(runner, agents):
+    runner.close()
+    for agent in agents:
+        agent.join()
+        assert agent.exitcode == 0
+
+
+def test_distributed_tcp():
+    data_list = list(range(200))
+    runner = DistributedRunner(OrderedScale, ("127.0.0.1", 0), cfg=CfgNode({"scale": 2}), authkey="secret", chunksize=3)
+    agents = start_agents(runner, 3, "secret")
+
+    assert runner(data_list) == [data * 2 for data in data_list]
+    assert list(runner.imap(iter(data_list))) == [data * 2 for data in data_list]
+    assert sorted(runner.imap_unordered(data_list)) == [data * 2 for data in data_list]
+
+    results = runner.imap(data_list)
+    assert [next(results) for _ in range(10)] == [data * 2 for data in range(10)]
+    results.close()
+
+    with pytest.raises(Exception, match="bad data"):
+        runner([1, 2, "bad", 3])
+    assert runner(data_list) == [data * 2 for data in data_list]
+    stop(runner, agents)
+
+
+def test_distributed_unix_socket():
+    path = os.path.join(tempfile.mkdtemp(), "runner.sock")
+    runner = DistributedRunner(UnorderedScale, path, cfg=CfgNode({"scale": 3}))
+    agents = start_agents(runner, 2)
+    assert runner(range(100)) == sum(range(100)) * 3
+    stop(runner, agents)
+
+
+def test_distributed_lost_agent():
+    data_list = list(range(100))
+    runner = DistributedRunner(OrderedScale, ("127.0.0.1", 0), cfg=CfgNode({"scale": 2, "slow": True}), max_inflight=8)
+    agents = start_agents(runner, 2, runner.authkey)
+
+    results = runner.imap(data_list)
+    assert [next(results) for _ in range(10)] == [data * 2 for data in range(10)]
+    agents[0].terminate()
+    # the chunks of the lost agent are dispatched again to the other one
+    assert list(results) == [data * 2 for data in range(10, 100)]
+    assert runner.num_agents == 1
+
+    runner.close()
+    agents[1].join()
+
+
+def test_distributed_authkey():
+    # a random key is generated for TCP addresses
+    runner = DistributedRunner(UnorderedScale, ("127.0.0.1", 0), cfg=CfgNode({"scale": 2}))
+    assert isinstance(runner.authkey, str) and len(runner.authkey) >= 32
+    with pytest.raises(Exception, match="authkey"):
+        run_agent(runner.address, None)
+    with pytest.raises(mp.AuthenticationError):
+        run_agent(runner.address, "wrong")
+    agents = start_agents(runner, 1, runner.authkey)
+    assert runner(range(10)) == sum(range(10)) * 2
+    stop(runner, agents)
+
+
+def test_agent_cli():
+    runner = DistributedRunner(UnorderedScale, ("127.0.0.1", 0), cfg=CfgNode({"scale": 2}), authkey="secret")
+    agents = subprocess.Popen([sys.executable, "-m", "easycore.common.parallel.agent",
+                               "--address", "{}:{}".format(*runner.address),
+                               "--devices", "cpu", "cpu", "--path", os.path.dirname(os.path.abspath(__file__))],
+                              env=dict(os.environ, EASYCORE_AUTHKEY="secret"))
+    assert runner.wait_agents(2, timeout=30)
+    assert runner(range(100)) == sum(range(100)) * 2
+    runner.close()
+    assert agents.wait(timeout=30) == 0
+
+
+def test_distributed_no_agent():
+    runner = DistributedRunner(NamedLikeOrdered, ("127.0.0.1", 0), cfg=CfgNode({"scale": 2}), agent_timeout=0.3)
+    assert not runner.ordered
+    start = time.time()
+    with pytest.raises(Exception, match="no agent"):
+        runner(range(10))
+    assert time.time() - start < 5
+
+    # the runner works once an agent is connected
+    agents = start_agents(runner, 1, runner.authkey)
+    assert runner(range(10)) == sum(range(10)) * 2
+    stop(runner, agents)
@@ -0,0 +1,69 @@
+import threading
+import time
+import pytest
+from easycore.common.config import CfgNode
+from easycore.common.parallel import OrderedRunner, UnorderedRunner
+
+class OrderedSquare(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+
+class SlowSquare(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        time.sleep(0.1)
+        return data * data
+
+
+class UnorderedSquare(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+
+def test_imap():
+    data_list = list(range(100))
+    for runner_class in [OrderedSquare, UnorderedSquare]:
+        runner = runner_class(3, chunksize=4)
+
+        assert list(runner.imap(data_list)) == [data * data for data in data_list]
+        assert sorted(runner.imap_unordered(iter(data_list), max_inflight=2)) == [data * data for data in data_list]
+
+        runner.close()
+
+
+def test_imap_abandoned():
+    runner = OrderedSquare(2)
+
+    data_list = list(range(100))
+
+    results = runner.imap(data_list)
+    assert [next(results) for _ in range(10)] == [data * data for data in data_list[:10]]
+    results.close()
+
+    # the runner can be reused after an abandoned iteration
+    assert list(runner.imap(data_list)) == [data * data for data in data_list]
+    assert runner(data_list) is None
+
+    runner.close()
+
+
+def test_imap_abandoned_after_failure():
+    runner = SlowSquare(2, prefetch=2)
+    threads = set(threading.enumerate())
+
+    results = runner.imap(range(100))
+    assert next(results) == 0
+    runner._fail(Exception("failed"))
+    # draining the abandoned iteration raises the failure, the feeder thread is stopped anyway
+    with pytest.raises(Exception, match="failed"):
+        results.close()
+    # only threads of the multiprocessing queues are started by the iteration
+    assert all(thread.name == "QueueFeederThread" for thread in set(threading.enumerate()) - threads)
+
+    runner.close()
@@ -0,0 +1,55 @@
+import json
+import pytest
+from easycore.common.parallel import OrderedRunner
+
+class Runner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.data_list.append(data)
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+def test_stats(tmp_path):
+    data_list = list(range(100))
+    for backend in ["process", "thread"]:
+        runner = Runner(2, backend=backend, chunksize=4, metrics=True)
+        assert runner(data_list) == [data * data for data in data_list]
+        assert list(runner.imap(data_list)) == [data * data for data in data_list]
+        runner.close()
+
+        stats = runner.stats()
+        stages = stats["stages"]
+        assert stages["work"]["data"] == 200
+        assert stages["work"]["chunks"] == 50
+        assert stages["dispatch"]["data"] == 200
+        assert stages["queue_wait"]["data"] == 200
+        assert stages["consume"]["data"] == 100
+        assert stages["serialize"]["data"] == (200 if backend == "process" else 0)
+        assert sorted(stats["workers"]) == [0, 1]
+        assert sum(worker["data"] for worker in stats["workers"].values()) == 200
+
+        runner.export_stats(str(tmp_path / "stats.json"))
+        with open(str(tmp_path / "stats.json")) as f:
+            assert json.load(f)["stages"]["work"]["data"] == 200
+        runner.export_stats(str(tmp_path / "stats.prom"))
+        with open(str(tmp_path / "stats.prom")) as f:
+            assert 'easycore_runner_stage_data_total{stage="work"} 200.0' in f.read()
+
+
+def test_stats_disabled():
+    runner = Runner(1)
+    with pytest.raises(Exception):
+        runner.stats()
+    runner.close()
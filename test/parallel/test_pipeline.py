@@ -0,0 +1,122 @@
+import pytest
+from easycore.common.parallel import OrderedRunner, UnorderedRunner, Pipeline
+
+class Decode(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return int(data)
+
+
+class Square(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+
+class OrderedSquare(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+
+class Format(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return "#{}".format(data)
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.data_list.append(data)
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+def generate(count, error = False):
+    for data in range(count):
+        yield str(data)
+    if error:
+        raise ValueError("broken input")
+
+
+def test_pipeline():
+    data_list = [str(data) for data in range(100)]
+    pipeline = Pipeline([Decode(2, chunksize=4), Square(3, backend="thread"), Format(1)], ordered=[True, False, True], buffer_size=4)
+
+    assert sorted(pipeline.imap(data_list)) == sorted("#{}".format(data * data) for data in range(100))
+    assert sorted(pipeline(generate(100))) == sorted("#{}".format(data * data) for data in range(100))
+
+    pipeline.close()
+
+
+def test_pipeline_ordered():
+    pipeline = Pipeline([Decode(2), OrderedSquare(2), Format(2)], max_inflight=[2, None, 8])
+    assert list(pipeline.imap(generate(100))) == ["#{}".format(data * data) for data in range(100)]
+    assert pipeline(generate(100)) == ["#{}".format(data * data) for data in range(100)]
+    pipeline.close()
+
+
+def test_pipeline_abandoned():
+    pipeline = Pipeline([Decode(2), OrderedSquare(2)], buffer_size=1)
+
+    results = pipeline.imap(generate(1000))
+    assert [next(results) for _ in range(10)] == [data * data for data in range(10)]
+    results.close()
+
+    # the stages can be reused after an abandoned iteration
+    assert list(pipeline.imap(generate(20))) == [data * data for data in range(20)]
+    pipeline.close()
+
+
+def test_pipeline_error():
+    pipeline = Pipeline([Decode(2), OrderedSquare(2)])
+    with pytest.raises(ValueError, match="broken input"):
+        list(pipeline.imap(generate(10, error=True)))
+    assert list(pipeline.imap(generate(10))) == [data * data for data in range(10)]
+
+    with pytest.raises(Exception):
+        Pipeline([pipeline.stages[0], pipeline.stages[0]])
+    with pytest.raises(Exception):
+        Pipeline(pipeline.stages, ordered=[True])
+    pipeline.close()
+
+
+class Fill(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        import numpy as np
+        # large enough to go through shared memory
+        return np.full(100000, data, dtype=np.float64)
+
+
+class Mean(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, array):
+        assert (array == array[0]).all()
+        return float(array[0])
+
+
+def test_pipeline_shared_memory():
+    pytest.importorskip("numpy")
+    pytest.importorskip("multiprocessing.shared_memory")
+    # the first stage runs far ahead of the second one, its segments are reused meanwhile
+    pipeline = Pipeline([Fill(2, shared_memory=True), Mean(2, backend="thread")], buffer_size=64)
+    assert list(pipeline.imap(range(200))) == [float(data) for data in range(200)]
+    pipeline.close()
+
+    pipeline = Pipeline([Decode(2), Fill(2, shared_memory=True)])
+    arrays = list(pipeline.imap(generate(50)))
+    assert [float(array[0]) for array in arrays] == [float(data) for data in range(50)]
+    assert all((array == array[0]).all() for array in arrays)
+    pipeline.close()
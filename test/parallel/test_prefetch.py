@@ -0,0 +1,55 @@
+import threading
+import time
+import pytest
+from easycore.common.parallel import OrderedRunner
+
+class Runner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.data_list.append(data)
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+def generate(count, threads, error = False):
+    for data in range(count):
+        threads.add(threading.get_ident())
+        time.sleep(0.001)
+        yield data
+    if error:
+        raise ValueError("broken input")
+
+
+def test_prefetch():
+    runner = Runner(2, chunksize=3, prefetch=4)
+    threads = set()
+    assert runner(generate(50, threads)) == [data * data for data in range(50)]
+    # the generator is read by the feeder thread
+    assert threads and threading.get_ident() not in threads
+    assert list(runner.imap(generate(50, set()))) == [data * data for data in range(50)]
+
+    # abandoned iteration
+    results = runner.imap(generate(1000, set()))
+    assert [next(results) for _ in range(5)] == [data * data for data in range(5)]
+    results.close()
+    assert runner(range(10)) == [data * data for data in range(10)]
+    runner.close()
+
+
+def test_prefetch_error():
+    runner = Runner(2, prefetch=2)
+    with pytest.raises(ValueError, match="broken input"):
+        list(runner.imap(generate(10, set(), error=True)))
+    assert list(runner.imap(range(10))) == [data * data for data in range(10)]
+    runner.close()
@@ -0,0 +1,54 @@
+import pstats
+import pytest
+from easycore.common.parallel import UnorderedRunner
+
+def square(data):
+    return data * data
+
+
+class Runner(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return square(data)
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.sum = 0
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.sum += data
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.sum
+
+
+def calls(stats, func_name):
+    return sum(value[1] for func, value in stats.stats.items() if func[2] == func_name)
+
+
+def test_profile(tmp_path):
+    for backend in ["process", "thread"]:
+        path = str(tmp_path / "{}.prof".format(backend))
+        runner = Runner(2, backend=backend, profile=path)
+        assert runner(range(100)) == sum(data * data for data in range(100))
+        runner.close()
+
+        assert runner.profile_workers() == ["consumer", "producer0", "producer1"]
+        assert calls(runner.profile_stats(), "square") == 100
+        assert calls(runner.profile_stats("producer0"), "square") + \
+            calls(runner.profile_stats("producer1"), "square") == 100
+        assert calls(runner.profile_stats("consumer"), "consumer_work") == 100
+
+        # merged profile and a file for each worker
+        assert calls(pstats.Stats(path), "square") == 100
+        assert calls(pstats.Stats(path + ".consumer"), "consumer_work") == 100
+
+
+def test_profile_disabled():
+    runner = Runner(1)
+    with pytest.raises(Exception):
+        runner.profile_stats()
+    runner.close()
@@ -0,0 +1,60 @@
+import time
+from easycore.common.config import CfgNode
+from easycore.common.parallel import OrderedRunner
+
+class Runner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        if data % 20 == 0:
+            time.sleep(0.05)  # straggler blocks the head of the reorder window
+        return data * data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.data_list.append(data)
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+class PeakBuffer(dict):
+    """ reorder buffer recording its largest size """
+    peak = 0
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.peak = max(self.peak, len(self))
+
+
+def test_reorder_window():
+    runner = Runner(3, max_reorder=4)
+
+    data_list = list(range(100))
+
+    runner._reorder_buffer = PeakBuffer()
+    assert runner(data_list) == [data * data for data in data_list]
+    assert len(runner._reorder_buffer) == 0
+    assert 1 <= runner._reorder_buffer.peak <= 4
+
+    runner._reorder_buffer = PeakBuffer()
+    assert list(runner.imap(data_list)) == [data * data for data in data_list]
+    assert len(runner._reorder_buffer) == 0
+    assert 1 <= runner._reorder_buffer.peak <= 4
+
+    runner.close()
+
+
+def test_reorder_window_with_chunks():
+    runner = Runner(3, chunksize=3, max_reorder=2)
+
+    data_list = list(range(100))
+
+    assert runner(data_list) == [data * data for data in data_list]
+
+    runner.close()
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import signal
+import sys
+import time
+import pytest
+from easycore.common.config import CfgNode
+from easycore.common.parallel import OrderedRunner, UnorderedRunner
+
+class CrashRunner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        # the first producer reaching 13 dies abruptly
+        if data == 13 and not os.path.exists(cfg.marker):
+            open(cfg.marker, "w").close()
+            os._exit(1)
+        return data * data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.data_list.append(data)
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+def test_restart(tmp_path):
+    data_list = list(range(50))
+    for scheduler in ["shared", "round_robin", "throughput"]:
+        cfg = CfgNode({"marker": str(tmp_path / scheduler)})
+        runner = CrashRunner(2, cfg=cfg, scheduler=scheduler)
+        assert runner(data_list) == [data * data for data in data_list]
+        assert os.path.exists(cfg.marker)
+        assert runner(data_list) == [data * data for data in data_list]
+        runner.close()
+
+    cfg = CfgNode({"marker": str(tmp_path / "imap")})
+    runner = CrashRunner(2, cfg=cfg, chunksize=4)
+    assert list(runner.imap(data_list)) == [data * data for data in data_list]
+    runner.close()
+
+
+class SumRunner(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return CrashRunner.producer_work(device, cfg, data)
+
+    @staticmethod
+    def producer_combine(device, cfg, partial, data):
+        return data if partial is None else partial + data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.sum = 0
+
+    @staticmethod
+    def consumer_merge(cfg, partial):
+        cfg.sum += partial
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.sum
+
+
+def test_restart_combine(tmp_path):
+    cfg = CfgNode({"marker": str(tmp_path / "combine")})
+    runner = SumRunner(2, cfg=cfg)
+    assert runner(range(50)) == sum([data * data for data in range(50)])
+    runner.close()
+
+
+class FailRunner(CrashRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        if data == 3:
+            os._exit(1)
+        return data
+
+
+class SquareRunner(CrashRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="SIGKILL is not available on Windows")
+def test_kill_idle():
+    data_list = list(range(50))
+    for scheduler in ["shared", "round_robin"]:
+        runner = SquareRunner(3, scheduler=scheduler, max_restarts=10)
+        for index in range(3):
+            assert runner(data_list) == [data * data for data in data_list]
+            # an idle producer holds the read lock of its queue while it waits
+            time.sleep(0.2)
+            os.kill(runner.producers[index].pid, signal.SIGKILL)
+            runner.producers[index].join()
+            assert list(runner.imap(data_list)) == [data * data for data in data_list]
+        runner.close()
+
+
+def test_restart_limit():
+    runner = FailRunner(2, max_restarts=1)
+    with pytest.raises(Exception, match="exited unexpectedly"):
+        runner(range(10))
+    with pytest.raises(Exception, match="exited unexpectedly"):
+        runner(range(10))
+    runner.close()
+
+    # the runner works again after it is restarted
+    runner.activate()
+    assert runner(range(3)) == [0, 1, 2]
+    runner.close()
+
+
+def test_no_restarts():
+    # producers do not record the chunks and locks they hold
+    runner = FailRunner(2, max_restarts=0)
+    assert all(len(runner._worker_slots[index]) == 1 for index in runner._active_workers)
+    with pytest.raises(Exception, match="after 0 restarts"):
+        runner(range(10))
+    runner.close()
+
+
+class RaiseRunner(CrashRunner):
+
+    @staticmethod
+    def producer_init(device, cfg):
+        # counts calls of `producer_init` in this producer
+        cfg.inits = getattr(cfg, "inits", 0) + 1
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        if data == 7:
+            raise ValueError("bad data {}".format(data))
+        return data * cfg.inits
+
+
+class RaiseSumRunner(SumRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        if data == 7:
+            raise ValueError("bad data {}".format(data))
+        return data
+
+
+def test_work_exception():
+    for backend in ["process", "thread"]:
+        runner = RaiseRunner(2, backend=backend)
+        # the traceback of the producer is raised, producers are not restarted
+        with pytest.raises(Exception, match="ValueError: bad data 7"):
+            runner(range(50))
+        assert runner(range(5)) == [0, 1, 2, 3, 4]
+
+        with pytest.raises(Exception, match="ValueError: bad data 7"):
+            list(runner.imap(range(50)))
+        assert sorted(runner.imap_unordered(range(5))) == [0, 1, 2, 3, 4]
+
+        loop = asyncio.new_event_loop()
+        try:
+            with pytest.raises(Exception, match="ValueError: bad data 7"):
+                loop.run_until_complete(runner.submit(7))
+            assert loop.run_until_complete(runner.submit(3)) == 3
+        finally:
+            loop.close()
+        runner.close()
+
+    runner = RaiseSumRunner(2)
+    with pytest.raises(Exception, match="ValueError: bad data 7"):
+        runner(range(50))
+    assert runner(range(5)) == 10
+    runner.close()
@@ -0,0 +1,72 @@
+import time
+from easycore.common.config import CfgNode
+from easycore.common.parallel import OrderedRunner
+
+class Runner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        if device == "slow":
+            time.sleep(0.02)
+        return device, data * data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.data_list.append(data)
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+def test_schedulers():
+    data_list = list(range(90))
+    for scheduler in ["round_robin", "least_loaded"]:
+        runner = Runner(["slow", "fast", "fast"], scheduler=scheduler)
+
+        result = runner(data_list)
+        assert [data for _, data in result] == [data * data for data in data_list]
+        assert [data for _, data in runner.imap(data_list)] == [data * data for data in data_list]
+
+        runner.close()
+
+
+def test_work_stealing():
+    runner = Runner(["slow", "fast", "fast"], scheduler="round_robin")
+
+    data_list = list(range(90))
+    devices = [device for device, _ in runner(data_list)]
+
+    # a third of the chunks are dispatched to the slow producer, fast producers steal most of them
+    assert devices.count("slow") < len(data_list) // 3
+
+    runner.close()
+
+
+class SimulatedDeviceRunner(Runner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        time.sleep(0.02 if device == "slow" else 0.002)
+        return device, data
+
+
+def test_throughput_scheduler():
+    runner = SimulatedDeviceRunner(["slow", "fast"], scheduler="throughput")
+
+    data_list = list(range(100))
+    result = runner(data_list)
+    assert [data for _, data in result] == data_list
+
+    # the fast producer is measured to be about 10x faster and gets most of the data
+    devices = [device for device, _ in result]
+    assert devices.count("fast") > 0.75 * len(data_list)
+    assert runner._worker_item_times[0] > runner._worker_item_times[1]
+
+    assert [data for _, data in runner.imap(data_list)] == data_list
+
+    runner.close()
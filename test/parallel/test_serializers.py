@@ -0,0 +1,83 @@
+import pickle
+import pytest
+from easycore.common.parallel import OrderedRunner, UnorderedRunner
+from easycore.common.parallel.serialization import Serializer, get_serializer
+
+class Runner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return {"data": data, "bytes": bytes(data % 7) * 1000, "buffer": bytearray(data % 5)}
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.data_list.append(data)
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+class ReprSerializer(Serializer):
+
+    def dumps(self, obj):
+        return repr(obj)
+
+    def loads(self, payload):
+        return eval(payload)
+
+
+def expected(data_list):
+    return [{"data": data, "bytes": bytes(data % 7) * 1000, "buffer": bytearray(data % 5)} for data in data_list]
+
+
+def test_serializers():
+    data_list = list(range(50))
+    serializers = ["pickle", "pickle5", ReprSerializer()]
+    try:
+        import cloudpickle
+        serializers.append("cloudpickle")
+    except ImportError:
+        pass
+    for serializer in serializers:
+        for kwargs in [{}, {"chunksize": 4, "metrics": True}, {"scheduler": "round_robin"}]:
+            runner = Runner(2, serializer=serializer, **kwargs)
+            assert runner(data_list) == expected(data_list)
+            assert list(runner.imap(data_list)) == expected(data_list)
+            runner.close()
+
+
+def test_msgpack():
+    pytest.importorskip("msgpack")
+    runner = Runner(2, serializer="msgpack")
+    assert runner(range(20)) == expected(range(20))
+    runner.close()
+
+
+def test_pickle5_out_of_band():
+    serializer = get_serializer("pickle5")
+    data, buffers = serializer.dumps([pickle.PickleBuffer(b"x" * 1000), b"y"])
+    assert len(buffers) == 1 and len(data) < 1000
+    assert serializer.loads((data, buffers)) == [b"x" * 1000, b"y"]
+
+
+def test_cloudpickle_lambda():
+    pytest.importorskip("cloudpickle")
+    offset = 3
+    runner_class = type("LambdaRunner", (UnorderedRunner,), {
+        "producer_work": staticmethod(lambda device, cfg, data: data + offset),
+    })
+    runner = runner_class(2, serializer="cloudpickle", start_method="spawn")
+    assert sorted(runner.imap_unordered(range(20))) == [data + offset for data in range(20)]
+    runner.close()
+
+
+def test_serializer_errors():
+    with pytest.raises(Exception):
+        Runner(1, serializer="yaml")
+    with pytest.raises(Exception):
+        Runner(1, serializer="pickle", backend="thread")
@@ -0,0 +1,82 @@
+import os
+import pytest
+from easycore.common.config import CfgNode
+from easycore.common.parallel import OrderedRunner
+
+np = pytest.importorskip("numpy")
+shared_memory = pytest.importorskip("multiprocessing.shared_memory")
+
+
+class Runner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return {"index": data, "feature": np.full((64, 256), data, dtype=np.float32)}
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        # arrays are views of shared memory, copy what we keep
+        cfg.data_list.append((data["index"], float(data["feature"].sum())))
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+class CrashRunner(Runner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        # the first producer reaching 13 dies abruptly
+        if data == 13 and not os.path.exists(cfg.marker):
+            open(cfg.marker, "w").close()
+            os._exit(1)
+        return {"index": data, "feature": np.full((64, 256), data, dtype=np.float32)}
+
+
+def test_runner():
+    runner = Runner(2, shared_memory=True)
+
+    data_list = list(range(50))
+
+    for _ in range(2):
+        result = runner(data_list)
+        assert result == [(data, float(data * 64 * 256)) for data in data_list]
+
+    runner.close()
+
+
+def test_imap():
+    runner = Runner(2, shared_memory=True)
+
+    # yielded arrays are kept after their segments are recycled
+    results = list(runner.imap(range(300)))
+    assert [(data["index"], float(data["feature"].sum())) for data in results] == \
+        [(data, float(data * 64 * 256)) for data in range(300)]
+
+    results = list(runner.imap_unordered(range(300)))
+    assert sorted((data["index"], float(data["feature"].sum())) for data in results) == \
+        [(data, float(data * 64 * 256)) for data in range(300)]
+
+    runner.close()
+
+
+def test_restart(tmp_path):
+    runner = CrashRunner(2, cfg=CfgNode({"marker": str(tmp_path / "marker")}), shared_memory=True)
+    prefixes = list(runner._shm_prefixes)
+
+    data_list = list(range(50))
+    assert runner(data_list) == [(data, float(data * 64 * 256)) for data in data_list]
+
+    # the segments of the dead producer are unlinked
+    dead = [prefix for prefix in prefixes if prefix not in runner._shm_prefixes]
+    assert len(dead) == 1
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=dead[0] + "0")
+    assert runner(data_list) == [(data, float(data * 64 * 256)) for data in data_list]
+
+    runner.close()
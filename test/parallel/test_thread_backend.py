@@ -0,0 +1,72 @@
+from easycore.common.config import CfgNode
+from easycore.common.parallel import OrderedRunner, UnorderedRunner
+
+class Runner(OrderedRunner):
+
+    @staticmethod
+    def producer_init(device, cfg):
+        cfg.offset = 1
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data + cfg.offset
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.data_list.append(data)
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+class SumRunner(UnorderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.sum = 0
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.sum += data
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.sum
+
+
+def test_thread_backend():
+    data_list = list(range(100))
+
+    runner = Runner(3, backend="thread")
+    assert runner(data_list) == [data * data + 1 for data in data_list]
+    assert list(runner.imap(data_list)) == [data * data + 1 for data in data_list]
+    runner.close()
+
+    runner = SumRunner(3, backend="thread", scheduler="least_loaded", chunksize="auto")
+    assert runner(data_list) == sum([data * data for data in data_list])
+    runner.close()
+
+
+class CallRunner(Runner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data()
+
+
+def test_thread_backend_without_serialization():
+    # lambdas can not be pickled, they are passed to producers as they are
+    unpicklable = [(lambda data=data: data) for data in range(10)]
+
+    runner = CallRunner(2, backend="thread")
+    assert runner(unpicklable) == list(range(10))
+    runner.close()
@@ -64,3 +64,31 @@ def test_runner():
     assert tuple(result.shape) == (100, 3)
     
     runner.close()
+
+
+class BatchRunner(Runner):
+
+    @staticmethod
+    def producer_work(device, cfg, batch):
+        with torch.no_grad():
+            data = torch.Tensor(batch).view(-1,1)
+            data = data.to(device)
+            output = cfg.model(data)
+            output = output.cpu()
+        return output
+
+    @staticmethod
+    def consumer_end(cfg):
+        data = torch.stack(cfg.data_list, dim=0)
+        return data
+
+def test_batch_runner():
+    runner = BatchRunner(devices=["cpu", "cpu"], max_batch_size=16, max_wait_ms=10)
+
+    data_list = list(range(100))
+
+    result = runner(data_list)
+
+    assert tuple(result.shape) == (100, 3)
+
+    runner.close()
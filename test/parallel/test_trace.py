@@ -0,0 +1,52 @@
+import json
+import pytest
+from easycore.common.parallel import OrderedRunner
+
+class Runner(OrderedRunner):
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return data * data
+
+    @staticmethod
+    def consumer_init(cfg):
+        cfg.data_list = []
+
+    @staticmethod
+    def consumer_work(cfg, data):
+        cfg.data_list.append(data)
+
+    @staticmethod
+    def consumer_end(cfg):
+        return cfg.data_list
+
+
+def test_trace(tmp_path):
+    data_list = list(range(20))
+    for backend in ["process", "thread"]:
+        runner = Runner(2, backend=backend, chunksize=4, trace=True)
+        assert runner(data_list) == [data * data for data in data_list]
+        runner.close()
+
+        path = str(tmp_path / "trace.json")
+        runner.export_trace(path)
+        with open(path) as f:
+            events = json.load(f)["traceEvents"]
+        names = [event["name"] for event in events if event["ph"] == "X"]
+        assert names.count("producer_init") == 2
+        assert names.count("producer_end") == 2
+        assert names.count("producer_work") == 20
+        assert names.count("consumer_work") == 20
+        for queue_name in ["input_queue", "output_queue"]:
+            begins = [event for event in events if event["name"] == queue_name and event["ph"] == "b"]
+            ends = [event for event in events if event["name"] == queue_name and event["ph"] == "e"]
+            assert len(begins) == len(ends) == 5
+        if backend == "process":
+            assert len(set(event["pid"] for event in events)) == 3
+
+
+def test_trace_disabled():
+    runner = Runner(1)
+    with pytest.raises(Exception):
+        runner.export_trace("trace.json")
+    runner.close()
@@ -1,3 +1,4 @@
+import pytest
 from easycore.common.config import CfgNode
 from easycore.common.parallel import UnorderedRunner
 
@@ -30,3 +31,19 @@ def test_runner():
     assert result == sum([data * data for data in data_list])
 
     runner.close()
+
+
+def broken_iter():
+    for data in range(10):
+        yield data
+    raise ValueError("broken input")
+
+
+def test_runner_input_error():
+    runner = Runner(devices=2)
+    with pytest.raises(ValueError):
+        runner(broken_iter())
+    # results of the failed call do not leak into the next one
+    assert runner(range(10)) == sum([data * data for data in range(10)])
+    assert runner([]) == 0
+    runner.close()
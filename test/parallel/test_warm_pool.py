@@ -0,0 +1,70 @@
+import os
+from easycore.common.config import CfgNode
+from easycore.common.parallel import OrderedRunner
+
+init_calls = []
+
+class PidRunner(OrderedRunner):
+
+    @staticmethod
+    def producer_init(device, cfg):
+        init_calls.append(device)
+
+    @staticmethod
+    def producer_work(device, cfg, data):
+        return os.getpid(), data * cfg.scale
+
+
+def pids(runner, data_list):
+    results = list(runner.imap(data_list))
+    assert [data for pid, data in results] == [data * 2 for data in data_list]
+    return set(pid for pid, data in results)
+
+
+def test_keep_warm():
+    data_list = list(range(50))
+    cfg = CfgNode({"scale": 2})
+    runner = PidRunner(2, cfg=cfg)
+    first = pids(runner, data_list)
+    runner.close(keep_warm=True)
+
+    # a new runner with the same class, devices and cfg takes over the producers
+    runner = PidRunner(2, cfg=CfgNode({"scale": 2}))
+    assert pids(runner, data_list) <= first
+    runner.close(keep_warm=True)
+    runner.activate()
+    assert pids(runner, data_list) <= first
+    runner.close()
+
+    # stopped by `close()`
+    runner = PidRunner(2, cfg=cfg)
+    assert not (pids(runner, data_list) & first)
+    runner.close(keep_warm=True)
+    PidRunner.clear_warm_pools()
+    runner = PidRunner(2, cfg=cfg)
+    assert not (pids(runner, data_list) & first)
+    runner.close()
+
+
+def test_keep_warm_resize():
+    data_list = list(range(50))
+    cfg = CfgNode({"scale": 2})
+    init_calls.clear()
+    runner = PidRunner(["cpu"] * 3, cfg=cfg, scheduler="round_robin", backend="thread", max_workers=3)
+    runner(data_list)
+    runner.resize(1)
+    runner.close(keep_warm=True)
+    assert len(init_calls) == 3
+
+    # the runner starts with 3 producers again, a producer is started and the others are reused
+    runner = PidRunner(["cpu"] * 3, cfg=cfg, scheduler="round_robin", backend="thread", max_workers=3)
+    assert runner.num_workers == 3
+    assert list(runner.imap(data_list)) == [(os.getpid(), data * 2) for data in data_list]
+    assert len(init_calls) == 5
+    runner.close()
+
+
+def test_forkserver():
+    runner = PidRunner(2, cfg=CfgNode({"scale": 2}), start_method="forkserver", preload=["easycore.common.parallel"])
+    assert os.getpid() not in pids(runner, list(range(20)))
+    runner.close()